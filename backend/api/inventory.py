@@ -1,19 +1,27 @@
+import os
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 
-from backend.models.database import get_db, Product, StockMovement, Invoice
-from backend.services.inventory_manager import InventoryManager
+from backend.models.database import get_db, SessionLocal, Product, Invoice
+from backend.services.inventory_manager import InventoryManager, StockConflictError
+from backend.services.stock_alerts import stock_status
+from backend.services import stock_history
+from backend.services.stock_snapshots import stock_at
+from backend.services.bulk_inventory import read_rows
 
 router = APIRouter()
 inventory_manager = InventoryManager()
 
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "10000"))
+
 class ProductCreate(BaseModel):
     name: str
     category: Optional[str] = None
@@ -30,11 +38,21 @@ class ProductResponse(BaseModel):
     price: float
     current_stock: float
     min_stock: float
+    reserved_stock: float = 0
     total_sold: float
     
     class Config:
         from_attributes = True
 
+class ReservationItem(BaseModel):
+    product_id: int
+    quantity: float
+
+class StockReservationRequest(BaseModel):
+    payment_id: int
+    items: List[ReservationItem]
+    ttl_seconds: Optional[int] = None
+
 class StockAdjustment(BaseModel):
     product_id: int
     quantity: float
@@ -51,11 +69,22 @@ async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     if existing:
         raise HTTPException(status_code=400, detail="Product already exists")
     
-    new_product = Product(**product.dict())
+    new_product = Product(
+        **product.dict(),
+        stock_status=stock_status(product.current_stock, product.min_stock)
+    )
     db.add(new_product)
     db.commit()
     db.refresh(new_product)
     
+    inventory_manager.name_index.add(new_product.id, new_product.name)
+    inventory_manager.record_stock_changes({
+        new_product.id: (
+            new_product.name, new_product.unit, new_product.current_stock,
+            new_product.min_stock, new_product.price
+        )
+    })
+    
     return new_product
 
 @router.get("/products", response_model=List[ProductResponse])
@@ -81,57 +110,158 @@ async def adjust_stock(adjustment: StockAdjustment, db: Session = Depends(get_db
     """
     Manually adjust stock (restock or correction)
     """
-    product = db.query(Product).filter(Product.id == adjustment.product_id).first()
-    if not product:
+    try:
+        result = inventory_manager.adjust_stock(
+            db,
+            adjustment.product_id,
+            adjustment.quantity,
+            adjustment.movement_type,
+            adjustment.notes
+        )
+    except StockConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if result is None:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    previous_stock = product.current_stock
-    new_stock = previous_stock + adjustment.quantity
-    
-    # Create stock movement record
-    movement = StockMovement(
-        product_id=product.id,
-        movement_type=adjustment.movement_type,
-        quantity=adjustment.quantity,
-        previous_stock=previous_stock,
-        new_stock=new_stock,
-        reference_type="manual",
-        notes=adjustment.notes
-    )
+    return {
+        "status": "success",
+        "product": result["product"],
+        "previous_stock": result["previous_stock"],
+        "new_stock": result["new_stock"],
+        "change": adjustment.quantity
+    }
+
+async def _read_bulk_rows(request: Request) -> List[dict]:
+    """
+    Rows from a JSON array body, a raw CSV body, or a multipart upload
+    (field "file", CSV or JSON)
+    """
+    content_type = request.headers.get("content-type", "")
+    filename = None
     
-    product.current_stock = new_stock
-    if adjustment.movement_type == "restock":
-        product.last_restocked_at = datetime.utcnow()
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Upload a CSV or JSON file in the 'file' field")
+        content = await upload.read()
+        content_type = upload.content_type or ""
+        filename = upload.filename
+    else:
+        content = await request.body()
     
-    db.add(movement)
-    db.commit()
+    try:
+        rows = read_rows(content, content_type, filename)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not rows:
+        raise HTTPException(status_code=400, detail="No rows to process")
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ROWS} rows per request")
+    return rows
+
+@router.post("/products/bulk")
+async def import_products(request: Request, db: Session = Depends(get_db)):
+    """
+    Create or update many products from a JSON array or CSV
+    (columns: name, category, unit, price, current_stock, min_stock)
+    
+    Existing products (same name) get their category, unit, price and
+    min_stock updated; invalid rows are reported and skipped.
+    """
+    rows = await _read_bulk_rows(request)
+    result = inventory_manager.import_products(db, rows)
     
     return {
-        "status": "success",
-        "product": product.name,
-        "previous_stock": previous_stock,
-        "new_stock": new_stock,
-        "change": adjustment.quantity
+        "status": "success" if not result["failed"] else "partial",
+        "total_rows": len(rows),
+        **result
+    }
+
+@router.post("/adjust-stock/bulk")
+async def bulk_adjust_stock(request: Request, db: Session = Depends(get_db)):
+    """
+    Apply many stock changes in one transaction, e.g. a stock opname
+    (columns: product_id or name, quantity or counted_stock,
+    movement_type, notes)
+    
+    counted_stock sets the stock to the physical count and records the
+    difference as an adjustment; invalid rows are reported and skipped.
+    """
+    rows = await _read_bulk_rows(request)
+    
+    try:
+        result = inventory_manager.bulk_adjust_stock(db, rows)
+    except StockConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return {
+        "status": "success" if not result["failed"] else "partial",
+        "total_rows": len(rows),
+        **result
     }
 
+@router.post("/reservations")
+async def reserve_stock(request: StockReservationRequest, db: Session = Depends(get_db)):
+    """
+    Hold stock for a payment waiting for verification
+    The hold is converted to a sale when the payment is verified, or
+    released when its TTL runs out
+    """
+    try:
+        result = inventory_manager.reserve_stock(
+            db,
+            request.payment_id,
+            [item.dict() for item in request.items],
+            request.ttl_seconds
+        )
+    except StockConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if result["status"] != "success":
+        status_code = 404 if result["message"] == "Payment not found" else 409
+        raise HTTPException(status_code=status_code, detail=result)
+    return result
+
+@router.delete("/reservations/{payment_id}")
+async def release_reservation(payment_id: int, db: Session = Depends(get_db)):
+    """
+    Release the stock held for a payment (e.g. cancelled order)
+    """
+    try:
+        released = inventory_manager.release_reservations(db, [payment_id])
+    except StockConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if not released:
+        raise HTTPException(status_code=404, detail="No active reservation for this payment")
+    return {"status": "success", "payment_id": payment_id}
+
+@router.get("/summary")
+async def get_inventory_summary(db: Session = Depends(get_db)):
+    """
+    Product count, low/out-of-stock counts and total inventory value
+    """
+    return inventory_manager.get_inventory_summary(db)
+
 @router.get("/low-stock")
 async def get_low_stock_products(db: Session = Depends(get_db)):
     """
     Get products with stock below minimum threshold
+    Served from the incrementally maintained alert set
     """
-    low_stock = db.query(Product).filter(
-        Product.current_stock <= Product.min_stock
-    ).all()
-    
     alerts = []
-    for product in low_stock:
+    for product in inventory_manager.stock_alerts.alerts(db):
         alerts.append({
-            "product_id": product.id,
-            "name": product.name,
-            "current_stock": product.current_stock,
-            "min_stock": product.min_stock,
-            "unit": product.unit,
-            "alert": f"⚠️ {product.name} running low: {product.current_stock} {product.unit} left"
+            "product_id": product["product_id"],
+            "name": product["name"],
+            "current_stock": product["current_stock"],
+            "min_stock": product["min_stock"],
+            "unit": product["unit"],
+            "status": product["status"],
+            "alert": f"⚠️ {product['name']} running low: {product['current_stock']} {product['unit']} left"
         })
     
     return {
@@ -178,6 +308,71 @@ async def process_supplier_invoice(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Invoice processing failed: {str(e)}")
 
+@router.post("/process-invoices")
+async def process_supplier_invoices(
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload a stack of supplier invoice images; OCR runs in parallel and
+    all restocks are applied in one transaction
+    """
+    import os
+    upload_dir = "uploads/invoices"
+    os.makedirs(upload_dir, exist_ok=True)
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    file_paths = []
+    rejected = []
+    
+    for index, file in enumerate(files):
+        if not file.content_type or not file.content_type.startswith('image/'):
+            rejected.append({
+                "image_path": None,
+                "filename": file.filename,
+                "status": "error",
+                "error": "File must be an image"
+            })
+            continue
+        
+        file_path = os.path.join(upload_dir, f"{timestamp}_{index}_{file.filename}")
+        with open(file_path, "wb") as f:
+            content = await file.read()
+            f.write(content)
+        file_paths.append(file_path)
+    
+    if not file_paths:
+        raise HTTPException(status_code=400, detail="No invoice images uploaded")
+    
+    try:
+        batch = await inventory_manager.process_invoice_batch(file_paths, db)
+    except StockConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Invoice processing failed: {str(e)}")
+    
+    batch["failed"] += len(rejected)
+    batch["invoices"].extend(rejected)
+    
+    return {
+        "status": "success",
+        "message": f"{batch['processed']} of {len(files)} invoices processed",
+        **batch
+    }
+
+@router.get("/forecast")
+async def get_all_stock_forecasts(
+    days: int = 7,
+    db: Session = Depends(get_db)
+):
+    """
+    Get predictive stock forecast for all products, most urgent first
+    """
+    try:
+        return await inventory_manager.forecast_all_stock_needs(days, db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Forecast failed: {str(e)}")
+
 @router.get("/forecast/{product_id}")
 async def get_stock_forecast(
     product_id: int,
@@ -197,32 +392,80 @@ async def get_stock_forecast(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Forecast failed: {str(e)}")
 
+@router.get("/stock-at/{product_id}")
+async def get_stock_at(product_id: int, at: datetime, db: Session = Depends(get_db)):
+    """
+    Stock of a product at a past moment (nearest snapshot + later movements)
+    """
+    result = stock_at(db, product_id, at)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return result
+
 @router.get("/history/{product_id}")
 async def get_stock_history(
     product_id: int,
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    group_by: Optional[str] = Query(None, pattern="^day$"),
     db: Session = Depends(get_db)
 ):
     """
-    Get stock movement history for a product
+    Get stock movement history for a product, newest first
+    
+    Pass next_cursor back as `cursor` for the next page. start/end filter
+    by movement time (end exclusive); group_by=day returns daily totals.
     """
-    movements = db.query(StockMovement).filter(
-        StockMovement.product_id == product_id
-    ).order_by(StockMovement.created_at.desc()).limit(limit).all()
+    if group_by == "day":
+        daily = stock_history.daily_history(db, product_id, start, end)
+        return {
+            "product_id": product_id,
+            "total_days": len(daily),
+            "daily": daily
+        }
+    
+    try:
+        movements, next_cursor = stock_history.history_page(
+            db, product_id, limit=limit, cursor=cursor, start=start, end=end
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "product_id": product_id,
         "total_movements": len(movements),
-        "history": [
-            {
-                "id": m.id,
-                "type": m.movement_type,
-                "quantity": m.quantity,
-                "previous": m.previous_stock,
-                "new": m.new_stock,
-                "date": m.created_at.isoformat(),
-                "notes": m.notes
-            }
-            for m in movements
-        ]
+        "history": movements,
+        "next_cursor": next_cursor
     }
+
+@router.get("/history/{product_id}/export")
+async def export_stock_history(
+    product_id: int,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """
+    Stream a product's full stock ledger as CSV or NDJSON
+    """
+    def rows():
+        # Own session: the response body outlives the request dependencies
+        db = SessionLocal()
+        try:
+            movements = stock_history.iter_history(db, product_id, start, end)
+            if format == "csv":
+                yield from stock_history.stream_csv(movements)
+            else:
+                yield from stock_history.stream_ndjson(movements)
+        finally:
+            db.close()
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"stock_history_{product_id}.{format}"
+    return StreamingResponse(
+        rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
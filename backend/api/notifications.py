@@ -10,6 +10,7 @@ from pydantic import BaseModel
 
 from backend.models.database import get_db, BankNotification
 from backend.services.notification_parser import NotificationParser
+from backend.api.inventory import inventory_manager
 
 router = APIRouter()
 parser = NotificationParser()
@@ -66,13 +67,19 @@ async def submit_bank_notification(
         match_result = validator.auto_match_notification(db, new_notification.id)
         
         if match_result["matched"]:
-            return {
+            response = {
                 "status": "success",
                 "message": "✅ Notification received and auto-matched!",
                 "notification_id": new_notification.id,
                 "payment_id": match_result["payment_id"],
                 "auto_matched": True
             }
+            
+            # The payment is verified now: turn its held stock into the sale
+            stock = inventory_manager.convert_verified_payment(db, match_result["payment_id"])
+            if stock:
+                response["stock"] = stock
+            return response
         else:
             return {
                 "status": "success",
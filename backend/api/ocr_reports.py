@@ -1,15 +1,25 @@
 import os
+import shutil
 import uuid
-from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from fastapi.responses import FileResponse
+from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from sqlalchemy.orm import Session
 import sys
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
+from backend.models.database import get_db, OCRJob
 from backend.services.advanced_ocr import AdvancedOCR
+from backend.services.ocr_jobs import JobRunner, job_dict
+from backend.services.table_export import FORMATS, MEDIA_TYPES, export_sheet, workbook_sheets
+from backend.services.book_conversion import IMAGE_EXTENSIONS, LAYOUTS
+from backend.services.ocr_clients import get_ocr_clients
+from backend.services.ocr_cache import get_ocr_cache
+from backend.services.ocr_dispatch import get_ocr_dispatcher
 from backend.services.auth_service import get_current_user
 
 router = APIRouter(prefix="/api/ocr", tags=["OCR"])
@@ -20,16 +30,32 @@ EXCEL_DIR = Path(__file__).parent.parent.parent / "uploads" / "excel_files"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 EXCEL_DIR.mkdir(parents=True, exist_ok=True)
 
-# Store file mappings (in production, use database)
-file_storage = {}
+# One AdvancedOCR per process; its backend clients live in the shared pool
+_ocr_processor = None
+
+def get_ocr_processor() -> AdvancedOCR:
+    global _ocr_processor
+    if _ocr_processor is None:
+        _ocr_processor = AdvancedOCR()
+    return _ocr_processor
+
+# Conversion jobs and the file index live in the ocr_jobs table
+job_runner = JobRunner(get_ocr_processor)
+
+def _accepted(job) -> JSONResponse:
+    return JSONResponse(status_code=202, content=job_dict(job, include_pages=False))
 
 @router.post("/book-to-excel")
 async def convert_book_to_excel(
     file: UploadFile = File(...),
-    current_user = Depends(get_current_user)
+    background: bool = Form(False),
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
     Convert handwritten book report to Excel file
+    With background=true the conversion is queued and the response (202)
+    points at /api/ocr/jobs/{job_id} for status polling
     """
     # Validate file type
     if not file.content_type.startswith('image/'):
@@ -41,58 +67,161 @@ async def convert_book_to_excel(
     image_path = UPLOAD_DIR / f"{file_id}{file_extension}"
     excel_path = EXCEL_DIR / f"{file_id}.xlsx"
     
-    try:
-        # Save uploaded image
-        with open(image_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Process image with OCR
-        ocr_processor = AdvancedOCR()
-        result = ocr_processor.extract_table_from_image(str(image_path))
-        
-        if not result["success"]:
-            raise HTTPException(status_code=400, detail=result.get("error", "OCR processing failed"))
-        
-        # Save to Excel
-        df = result["data"]
-        ocr_processor.save_to_excel(df, str(excel_path))
-        
-        # Store file mapping
-        file_storage[file_id] = {
-            "image_path": str(image_path),
-            "excel_path": str(excel_path),
-            "created_at": datetime.now().isoformat(),
-            "username": current_user.username
-        }
-        
-        return {
-            "message": "Book report successfully converted to Excel",
-            "file_id": file_id,
-            "rows_extracted": result["rows_extracted"],
-            "columns_detected": result["columns_detected"],
-            "preview": result["preview"],
-            "confidence": round(result["confidence"] * 100, 2),
-            "download_url": f"/api/ocr/download-excel/{file_id}"
-        }
-        
-    except Exception as e:
+    # Save uploaded image
+    await _save_upload(file, image_path)
+    
+    job = job_runner.create_job(
+        db, current_user.username, image_path, excel_path,
+        kind="image", job_id=file_id, queued=background
+    )
+    if background:
+        return _accepted(job)
+    
+    # Process image with OCR now, in this process
+    result = await run_in_threadpool(job_runner.run_job, job.id)
+    
+    if result["status"] != "done":
         # Cleanup on error
         if image_path.exists():
             os.remove(image_path)
-        if excel_path.exists():
-            os.remove(excel_path)
-        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+        raise HTTPException(status_code=400, detail=result.get("error") or "OCR processing failed")
+    
+    return {
+        "message": "Book report successfully converted to Excel",
+        "file_id": file_id,
+        "rows_extracted": result["rows_extracted"],
+        "columns_detected": result["columns_detected"],
+        "preview": result["preview"],
+        "confidence": result["confidence"],
+        "download_url": f"/api/ocr/download-excel/{file_id}"
+    }
+
+BATCH_EXTENSIONS = IMAGE_EXTENSIONS | {'.pdf', '.zip'}
+
+async def _save_upload(file: UploadFile, path: Path):
+    """Copy an upload to disk in 1 MB chunks"""
+    with open(path, "wb") as buffer:
+        while chunk := await file.read(1 << 20):
+            buffer.write(chunk)
+
+@router.post("/book-to-excel/batch")
+async def convert_book_batch_to_excel(
+    files: List[UploadFile] = File(...),
+    layout: str = Form("sheets"),
+    background: bool = Form(False),
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Convert a multi-page book report (PDFs, zips of page images, or several
+    images) to one Excel file: one sheet per page, or layout=merged for a
+    single sheet. Pages are processed in parallel; the response lists each
+    page's status and timing. With background=true the conversion is queued
+    and /api/ocr/jobs/{job_id} reports progress page by page
+    """
+    if layout not in LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"layout must be one of {', '.join(LAYOUTS)}")
+    for file in files:
+        if os.path.splitext(file.filename or "")[1].lower() not in BATCH_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"Unsupported file: {file.filename} (images, PDF or zip)")
+    
+    file_id = str(uuid.uuid4())
+    upload_dir = UPLOAD_DIR / file_id
+    upload_dir.mkdir(parents=True)
+    excel_path = EXCEL_DIR / f"{file_id}.xlsx"
+    
+    for index, file in enumerate(files):
+        await _save_upload(file, upload_dir / f"{index + 1:03d}_{Path(file.filename).name}")
+    
+    job = job_runner.create_job(
+        db, current_user.username, upload_dir, excel_path,
+        kind="book", layout=layout, job_id=file_id, queued=background
+    )
+    if background:
+        return _accepted(job)
+    
+    result = await run_in_threadpool(job_runner.run_job, job.id)
+    
+    if result["status"] != "done":
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=result.get("error") or "Book conversion failed")
+    
+    return {
+        "message": f"Book report converted: {result['pages_succeeded']} of {result['pages_total']} pages",
+        "file_id": file_id,
+        "layout": layout,
+        "pages": result["pages"],
+        "pages_total": result["pages_total"],
+        "pages_succeeded": result["pages_succeeded"],
+        "rows_extracted": result["rows_extracted"],
+        "elapsed_ms": result["processing_ms"],
+        "download_url": f"/api/ocr/download-excel/{file_id}"
+    }
+
+def _user_job(db: Session, job_id: str, username: str) -> OCRJob:
+    job = db.query(OCRJob).filter(OCRJob.id == job_id, OCRJob.username == username).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_ocr_job(job_id: str, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Status and progress of a conversion job
+    """
+    return job_dict(_user_job(db, job_id, current_user.username))
+
+@router.get("/jobs")
+async def list_ocr_jobs(
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Current user's conversion jobs, newest first
+    """
+    query = db.query(OCRJob).filter(OCRJob.username == current_user.username)
+    if status:
+        query = query.filter(OCRJob.status == status)
+    jobs = query.order_by(OCRJob.created_at.desc()).limit(limit).all()
+    return {"count": len(jobs), "jobs": [job_dict(job, include_pages=False) for job in jobs]}
+
+@router.get("/backends")
+async def get_ocr_backends(current_user = Depends(get_current_user)):
+    """
+    Health (circuit breaker state) of the shared OCR backend clients and
+    hedged dispatch counters
+    """
+    return {
+        "backends": get_ocr_clients().health(),
+        "dispatch": get_ocr_dispatcher().stats()
+    }
+
+@router.get("/cache")
+async def get_ocr_cache_stats(current_user = Depends(get_current_user)):
+    """
+    OCR response cache size and hit rate
+    """
+    return get_ocr_cache().stats()
+
+@router.delete("/cache")
+async def clear_ocr_cache(current_user = Depends(get_current_user)):
+    """
+    Drop every cached OCR result
+    """
+    return {"success": True, "removed": get_ocr_cache().clear()}
 
 @router.get("/download-excel/{file_id}")
-async def download_excel(file_id: str, current_user = Depends(get_current_user)):
+async def download_excel(file_id: str, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
     """
     Download converted Excel file
     """
-    if file_id not in file_storage:
+    job = db.query(OCRJob).filter(OCRJob.id == file_id, OCRJob.status == "done").first()
+    if job is None:
         raise HTTPException(status_code=404, detail="File not found")
     
-    excel_path = file_storage[file_id]["excel_path"]
+    excel_path = job.excel_path
     
     if not os.path.exists(excel_path):
         raise HTTPException(status_code=404, detail="Excel file not found")
@@ -103,24 +232,60 @@ async def download_excel(file_id: str, current_user = Depends(get_current_user))
         filename=f"laporan_{file_id}.xlsx"
     )
 
+@router.get("/export/{file_id}")
+async def export_table(
+    file_id: str,
+    format: str = Query("xlsx"),
+    sheet: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream one sheet of a converted file as xlsx, csv or parquet
+    (default: the first sheet)
+    """
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    
+    job = db.query(OCRJob).filter(OCRJob.id == file_id, OCRJob.status == "done").first()
+    if job is None or not os.path.exists(job.excel_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    sheets = await run_in_threadpool(workbook_sheets, job.excel_path)
+    sheet = sheet or sheets[0]
+    if sheet not in sheets:
+        raise HTTPException(status_code=404, detail=f"Sheet not found (available: {', '.join(sheets)})")
+    
+    try:
+        body = await run_in_threadpool(export_sheet, job.excel_path, sheet, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filename = f"laporan_{file_id}_{sheet.replace(' ', '_')}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/files")
-async def list_converted_files(current_user = Depends(get_current_user)):
+async def list_converted_files(current_user = Depends(get_current_user), db: Session = Depends(get_db)):
     """
     List all converted files for current user
     """
-    user_files = {
-        fid: info for fid, info in file_storage.items()
-        if info.get("username") == current_user.username
-    }
+    user_files = db.query(OCRJob.id, OCRJob.created_at).filter(
+        OCRJob.username == current_user.username,
+        OCRJob.status == "done"
+    ).order_by(OCRJob.created_at.desc()).all()
     
     return {
         "count": len(user_files),
         "files": [
             {
                 "file_id": fid,
-                "created_at": info["created_at"],
+                "created_at": created_at.isoformat(),
                 "download_url": f"/api/ocr/download-excel/{fid}"
             }
-            for fid, info in user_files.items()
+            for fid, created_at in user_files
         ]
     }
@@ -11,6 +11,7 @@ import os
 from backend.models.database import get_db, Payment, PaymentItem
 from backend.services.payment_validator import PaymentValidator
 from backend.services.qris_validator import QRISValidator
+from backend.api.inventory import inventory_manager
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -159,12 +160,20 @@ async def verify_payment(
         payment.notification_id = request.notification_id
         db.commit()
         
-        return {
+        response = {
             "status": "verified",
             "message": "✅ Payment verified successfully!",
             "confidence": confidence,
             "payment_id": request.payment_id
         }
+        
+        # Turn held stock into the sale; the reservations table decides, so
+        # holds made by another worker (or before a restart) are converted too
+        stock = inventory_manager.convert_verified_payment(db, request.payment_id)
+        if stock:
+            response["stock"] = stock
+        
+        return response
     else:
         return {
             "status": "failed",
@@ -7,19 +7,39 @@ sys.path.insert(0, str(backend_dir))
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
 import uvicorn
 from datetime import datetime
 from typing import Optional
+import asyncio
+import os
 
 from backend.api import payments, inventory, notifications, auth, ocr_reports
-from backend.models.database import engine, Base, get_db
+from backend.models.database import engine, Base, get_db, Product, StockMovement
 from backend.services.payment_validator import PaymentValidator
 from backend.services.inventory_manager import InventoryManager
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+# Columns added to existing tables (create_all skips tables that exist), with the value existing rows get
+PRODUCT_COLUMNS = {
+    "version": "INTEGER NOT NULL DEFAULT 1",
+    "stock_status": "VARCHAR(10) NOT NULL DEFAULT 'ok'",  # Re-flagged by stock_alerts.sync at startup
+    "reserved_stock": "FLOAT NOT NULL DEFAULT 0",
+}
+existing_columns = {column["name"] for column in inspect(engine).get_columns("products")}
+with engine.begin() as conn:
+    for name, ddl in PRODUCT_COLUMNS.items():
+        if name not in existing_columns:
+            conn.execute(text(f"ALTER TABLE products ADD COLUMN {name} {ddl}"))
+            print(f"✅ Added products.{name}")
+
+# Indexes added to existing tables
+for index in [*StockMovement.__table__.indexes, *Product.__table__.indexes]:
+    index.create(bind=engine, checkfirst=True)
+
 app = FastAPI(
     title="Inclusive AI UMKM - Payment & Inventory System",
     description="Automated payment validation and predictive inventory management for small businesses",
@@ -41,7 +61,88 @@ async def startup_event():
     from backend.api.auth import create_demo_user
     db = next(get_db())
     create_demo_user(db)
+    
+    # Product name index for invoice line matching
+    inventory.inventory_manager.name_index.build(db)
+    print(f"✅ Product name index built ({len(inventory.inventory_manager.name_index)} products)")
+    
+    # Low-stock flags and alert cache
+    fixed = inventory.inventory_manager.stock_alerts.sync(db)
+    alert_counts = inventory.inventory_manager.stock_alerts.counts()
+    print(f"✅ Stock alerts loaded ({alert_counts['low_stock']} low, {alert_counts['out_of_stock']} out, {fixed} re-flagged)")
+    
+    # Running inventory totals, reconciled periodically
+    inventory.inventory_manager.inventory_totals.load(db)
+    
+    # Expiry heap for stock reservations
+    inventory.inventory_manager.reservations.load(db)
+    print(f"✅ Stock reservations loaded ({len(inventory.inventory_manager.reservations)} active payments)")
     db.close()
+    
+    # Background book-to-Excel conversions (queued jobs from any worker)
+    ocr_reports.job_runner.start()
+    
+    asyncio.create_task(reconcile_inventory_periodically())
+    asyncio.create_task(expire_reservations_periodically())
+    asyncio.create_task(rebuild_name_index_periodically())
+
+def _reconcile_inventory_once():
+    db = next(get_db())
+    try:
+        return inventory.inventory_manager.reconcile_inventory(db)
+    finally:
+        db.close()
+
+async def reconcile_inventory_periodically():
+    """Check the cached inventory summary against the database"""
+    interval = int(os.getenv("INVENTORY_RECONCILE_SECONDS", "300"))
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            report = await loop.run_in_executor(None, _reconcile_inventory_once)
+            if not report["consistent"]:
+                print(f"⚠️ Inventory summary drifted, caches reloaded: {report['drift']}, {report['reflagged']} re-flagged")
+        except Exception as e:
+            print(f"❌ Inventory reconciliation failed: {e}")
+
+def _expire_reservations_once():
+    db = next(get_db())
+    try:
+        return inventory.inventory_manager.release_expired_reservations(db)
+    finally:
+        db.close()
+
+async def expire_reservations_periodically():
+    """Release stock held by payments that were never verified"""
+    interval = int(os.getenv("RESERVATION_SWEEP_SECONDS", "15"))
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            released = await loop.run_in_executor(None, _expire_reservations_once)
+            if released:
+                print(f"⏰ Released expired stock reservations for {released} payments")
+        except Exception as e:
+            print(f"❌ Reservation expiry failed: {e}")
+
+def _rebuild_name_index_once():
+    db = next(get_db())
+    try:
+        inventory.inventory_manager.name_index.build(db)
+    finally:
+        db.close()
+
+async def rebuild_name_index_periodically():
+    """Pick up products added or renamed by other workers and scripts"""
+    interval = int(os.getenv("PRODUCT_INDEX_REFRESH_SECONDS", "300"))
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, _rebuild_name_index_once)
+        except Exception as e:
+            print(f"❌ Product name index rebuild failed: {e}")
 
 # Include routers
 app.include_router(auth.router, tags=["authentication"])
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import create_engine, Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Text, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -39,6 +39,14 @@ def get_db():
     finally:
         db.close()
 
+def dialect_insert(db, table):
+    """INSERT construct with on_conflict_do_update support for the active database"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
 # Models
 class User(Base):
     __tablename__ = "users"
@@ -114,15 +122,22 @@ class Product(Base):
     # Stock
     current_stock = Column(Float, default=0)
     min_stock = Column(Float, default=10)  # Low stock threshold
+    stock_status = Column(String(10), nullable=False, default="ok", server_default="ok", index=True)  # ok, low, out
+    reserved_stock = Column(Float, nullable=False, default=0, server_default="0")  # Held by active reservations
     
     # Stats
     total_sold = Column(Float, default=0)
     last_restocked_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Optimistic concurrency: every stock write is a compare-and-swap on version
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    
     # Relationships
     stock_movements = relationship("StockMovement", back_populates="product")
     payment_items = relationship("PaymentItem", back_populates="product")
+    
+    __mapper_args__ = {"version_id_col": version}
 
 class StockMovement(Base):
     __tablename__ = "stock_movements"
@@ -145,6 +160,66 @@ class StockMovement(Base):
     
     # Relationships
     product = relationship("Product", back_populates="stock_movements")
+    
+    __table_args__ = (
+        # Keyset pagination of a product's history (newest first); covering on PostgreSQL
+        Index(
+            "ix_stock_movements_product_created", "product_id", "created_at", "id",
+            postgresql_include=["movement_type", "quantity", "previous_stock", "new_stock"]
+        ),
+    )
+
+class DailyProductSales(Base):
+    """Per-product daily sales rollup, maintained with every sale movement"""
+    __tablename__ = "daily_product_sales"
+    __table_args__ = (
+        UniqueConstraint("product_id", "sale_date", name="uq_daily_product_sales_product_date"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    sale_date = Column(Date, nullable=False, index=True)
+    
+    quantity = Column(Float, nullable=False, default=0)  # Units sold (positive)
+    transactions = Column(Integer, nullable=False, default=0)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class StockReservation(Base):
+    """Stock held for an unverified payment until it is verified or expires"""
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        Index("ix_stock_reservations_status_expires", "status", "expires_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    payment_id = Column(Integer, ForeignKey("payments.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Float, nullable=False)
+    
+    status = Column(String(20), nullable=False, default="active")  # active, converted, released, expired
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    resolved_at = Column(DateTime)
+
+class StockSnapshot(Base):
+    """
+    Per-product stock checkpoint: stock after every movement with
+    id <= last_movement_id (all of which were created by snapshot_at)
+    """
+    __tablename__ = "stock_snapshots"
+    __table_args__ = (
+        UniqueConstraint("product_id", "last_movement_id", name="uq_stock_snapshots_product_movement"),
+        Index("ix_stock_snapshots_product_at", "product_id", "snapshot_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    snapshot_at = Column(DateTime, nullable=False)
+    last_movement_id = Column(Integer, nullable=False, index=True)
+    stock = Column(Float, nullable=False)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 class PaymentItem(Base):
     __tablename__ = "payment_items"
@@ -178,3 +253,38 @@ class Invoice(Base):
     is_processed = Column(Boolean, default=False)
     processed_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class OCRJob(Base):
+    """Book-to-Excel conversion job; finished jobs are the user's converted files"""
+    __tablename__ = "ocr_jobs"
+    __table_args__ = (
+        Index("ix_ocr_jobs_username_created", "username", "created_at"),
+        Index("ix_ocr_jobs_status_created", "status", "created_at"),
+    )
+    
+    id = Column(String(36), primary_key=True)  # Also the file_id of the Excel file
+    username = Column(String(50), nullable=False)
+    kind = Column(String(10), nullable=False, default="image")  # image, book
+    layout = Column(String(10))  # sheets, merged (book jobs)
+    status = Column(String(10), nullable=False, default="queued")  # queued, running, done, failed
+    worker = Column(String(100))  # host:pid running the job
+    
+    input_path = Column(String(500), nullable=False)  # Uploaded image, or directory of book files
+    excel_path = Column(String(500), nullable=False)
+    
+    pages_done = Column(Integer, default=0)
+    pages_total = Column(Integer)
+    pages_succeeded = Column(Integer)
+    rows_extracted = Column(Integer)
+    columns_detected = Column(Integer)
+    confidence = Column(Float)
+    backend = Column(String(20))
+    preview = Column(Text)
+    pages = Column(Text)  # JSON list of per-page summaries
+    error = Column(Text)
+    processing_ms = Column(Float)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
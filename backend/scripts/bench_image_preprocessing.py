@@ -0,0 +1,104 @@
+"""
+Benchmark OCR image preprocessing per stage on synthetic ledger pages
+
+Draws a ruled ledger page with text rows, rotates it by a known angle and
+adds noise, then compares the previous full-resolution Hough deskew with
+the pyramid estimate (angle error and time) and reports milliseconds per
+stage of the handwriting pipeline for several filter settings.
+
+Usage:
+    python backend/scripts/bench_image_preprocessing.py --width 2480 --height 3508 --pages 3
+    python backend/scripts/bench_image_preprocessing.py --skew 4 --max-side 768
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.services.image_preprocessing import PreprocessConfig, estimate_skew, preprocess_handwriting, rotate
+
+
+def synthetic_page(rng: np.random.Generator, width: int, height: int, skew: float) -> np.ndarray:
+    """BGR ledger page rotated by skew degrees"""
+    page = np.full((height, width, 3), 245, dtype=np.uint8)
+    row_height = max(40, height // 45)
+    scale = row_height / 40
+    for y in range(row_height * 2, height - row_height, row_height):
+        cv2.line(page, (width // 20, y), (width - width // 20, y), (120, 120, 120), max(1, int(scale)))
+        cells = [f"{rng.integers(1, 31):02d}/12/2023", f"Barang {rng.integers(1, 99)}", f"Rp {rng.integers(1, 999)}.000"]
+        for idx, text in enumerate(cells):
+            x = width // 20 + idx * width // 3 + 10
+            cv2.putText(page, text, (x, y - row_height // 4), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.9 * scale, (30, 30, 30), max(1, int(2 * scale)), cv2.LINE_AA)
+
+    page = rotate(page, skew)
+    noise = rng.normal(0, 12, page.shape)
+    return np.clip(page + noise, 0, 255).astype(np.uint8)
+
+
+def legacy_skew(gray: np.ndarray) -> float:
+    """The full-resolution estimate both OCR services used before image_preprocessing"""
+    edges = cv2.Canny(gray, 50, 150, apertureSize=3)
+    lines = cv2.HoughLines(edges, 1, np.pi / 180, 200)
+    if lines is None:
+        return 0.0
+    angles = [(theta * 180 / np.pi) - 90 for rho, theta in lines[:, 0]]
+    angles = [angle for angle in angles if -45 < angle < 45]
+    return float(np.median(angles)) if angles else 0.0
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR image preprocessing")
+    parser.add_argument("--width", type=int, default=2480)
+    parser.add_argument("--height", type=int, default=3508)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--skew", type=float, default=2.5, help="Rotation applied to the pages, degrees")
+    parser.add_argument("--max-side", type=int, default=1024, help="Pyramid level size for the skew estimate")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    pages = [synthetic_page(rng, args.width, args.height, args.skew) for _ in range(args.pages)]
+    grays = [cv2.cvtColor(page, cv2.COLOR_BGR2GRAY) for page in pages]
+    # The page was rotated by +skew, so straightening it takes -skew
+    print(f"📄 {args.pages} pages, {args.width}x{args.height}, skew {args.skew:g}°")
+
+    for label, estimate in (("full-res Hough", legacy_skew),
+                            (f"pyramid ≤{args.max_side}", lambda gray: estimate_skew(gray, args.max_side))):
+        results = [timed(estimate, gray) for gray in grays]
+        errors = [abs(angle + args.skew) for angle, _ in results]
+        print(f"   {label:>16}: median {statistics.median(ms for _, ms in results):8.1f} ms, "
+              f"max error {max(errors):.2f}°")
+
+    configs = {
+        "default": PreprocessConfig(deskew_max_side=args.max_side),
+        "median denoise": PreprocessConfig(deskew_max_side=args.max_side, denoise="median"),
+        "no bilateral": PreprocessConfig(deskew_max_side=args.max_side, bilateral=False, denoise="median"),
+    }
+    for label, config in configs.items():
+        stages = {}
+        for page in pages:
+            timings = {}
+            preprocess_handwriting(page, config, timings)
+            for stage, ms in timings.items():
+                stages.setdefault(stage, []).append(ms)
+        medians = {stage: statistics.median(values) for stage, values in stages.items()}
+        print(f"   {label:>16}: total {sum(medians.values()):8.1f} ms  " +
+              "  ".join(f"{stage} {ms:.1f}" for stage, ms in medians.items()))
+
+if __name__ == "__main__":
+    main()
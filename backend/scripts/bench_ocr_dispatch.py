@@ -0,0 +1,99 @@
+"""
+Benchmark cloud OCR tail latency against the local Vision / Gemini stubs
+
+Starts both stubs (scripts/ocr_stub_servers.py) with the given latency
+profiles, points the OCR clients at them and runs AdvancedOCR extraction
+once per hedge delay (-1 = no hedging, plain sequential fallback), with
+the response cache disabled so every request goes to the network.
+
+Usage:
+    python backend/scripts/bench_ocr_dispatch.py --requests 200 --vision-tail-rate 0.1 --vision-tail-latency 8
+    python backend/scripts/bench_ocr_dispatch.py --hedge-delays -1,1,0.5 --vision-error-rate 0.3
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.scripts.ocr_stub_servers import (add_profile_arguments, profile_from_args,
+                                              start_gemini_stub, start_vision_stub)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def run(image_path: str, hedge_delay: float, args) -> None:
+    from backend.services.advanced_ocr import AdvancedOCR
+    from backend.services.ocr_cache import OCRCache
+    from backend.services.ocr_clients import OCRClientPool
+    from backend.services.ocr_dispatch import OCRDispatcher
+
+    # Fresh breakers per run, cache off
+    pool = OCRClientPool()
+    dispatcher = OCRDispatcher(pool, hedge_delay=hedge_delay, deadline=args.deadline, workers=args.concurrency * 2)
+    ocr = AdvancedOCR(clients=pool, cache=OCRCache(max_bytes=0), dispatcher=dispatcher)
+
+    def one(_):
+        started = time.perf_counter()
+        backend, words = ocr.extract_text_with_backend(image_path)
+        return time.perf_counter() - started, backend, len(words)
+
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        results = list(executor.map(one, range(args.requests)))
+
+    latencies = [latency * 1000 for latency, _, _ in results]
+    empty = sum(1 for _, _, words in results if words == 0)
+    stats = dispatcher.stats()
+    label = "off" if hedge_delay < 0 else f"{hedge_delay:g}s"
+    print(
+        f"hedge {label:>5}: p50 {statistics.median(latencies):7.0f} ms  "
+        f"p95 {percentile(latencies, 95):7.0f} ms  p99 {percentile(latencies, 99):7.0f} ms  "
+        f"max {max(latencies):7.0f} ms  empty {empty}  hedges {stats['hedges']}  wins {stats['wins']}"
+    )
+    print("             breakers: " + ", ".join(
+        f"{name} {status['state']} ({status['failures']}/{status['calls']} failed)"
+        for name, status in pool.health().items()
+    ))
+    dispatcher.executor.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hedged OCR dispatch against stub backends")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--hedge-delays", default="-1,1.0,0.5", help="Comma-separated; -1 disables hedging")
+    parser.add_argument("--deadline", type=float, default=10.0)
+    add_profile_arguments(parser, "vision", 0.3)
+    add_profile_arguments(parser, "gemini", 0.8)
+    args = parser.parse_args()
+
+    vision = start_vision_stub(profile=profile_from_args(args, "vision"))
+    gemini = start_gemini_stub(profile=profile_from_args(args, "gemini"))
+    os.environ["GOOGLE_VISION_ENDPOINT"] = f"http://127.0.0.1:{vision.server_port}"
+    os.environ["GEMINI_ENDPOINT"] = f"http://127.0.0.1:{gemini.server_port}"
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    os.environ.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = str(Path(tmp) / "page.png")
+        cv2.imwrite(image_path, np.full((200, 600, 3), 255, dtype=np.uint8))
+
+        print(f"📊 {args.requests} requests, concurrency {args.concurrency}, deadline {args.deadline:g}s")
+        for hedge_delay in [float(value) for value in args.hedge_delays.split(",")]:
+            run(image_path, hedge_delay, args)
+
+if __name__ == "__main__":
+    main()
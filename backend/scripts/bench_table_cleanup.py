@@ -0,0 +1,115 @@
+"""
+Benchmark ledger table cleanup on synthetic OCR rows
+
+Generates ledgers with Rupiah amounts in mixed formats, day-first dates,
+digit look-alike letters (O for 0, l for 1) and ragged rows, then times
+normalize_table against the previous cleanup (padding loop plus
+pd.to_numeric per column, which left all of these as text). Also checks
+that unprefixed dotted thousands ("12.500") are read as Rupiah, not decimals.
+
+Usage:
+    python backend/scripts/bench_table_cleanup.py --rows 5000 --tables 10
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.services.table_cleanup import normalize_table
+
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "Mei", "Jun", "Jul", "Agu", "Sep", "Okt", "Nov", "Des"]
+
+
+def amount_text(rng: np.random.Generator, value: int) -> str:
+    grouped = f"{value:,}"
+    style = rng.integers(0, 4)
+    if style == 0:
+        return "Rp " + grouped.replace(",", ".") + ",00"
+    if style == 1:
+        return grouped.replace(",", ".") + ",-"
+    if style == 2:
+        return grouped
+    return str(value)
+
+
+def synthetic_ledger(rng: np.random.Generator, rows: int):
+    table = [["No", "Tanggal", "Keterangan", "Qty", "Harga", "Total"]]
+    for r in range(rows):
+        day, month = int(rng.integers(1, 29)), int(rng.integers(1, 13))
+        date = f"{day:02d}/{month:02d}/2024" if rng.random() < 0.5 else f"{day} {MONTH_NAMES[month - 1]} 2024"
+        qty = int(rng.integers(1, 50))
+        price = int(rng.integers(1, 500)) * 500
+        row = [str(r + 1), date, f"Barang {r % 37}", str(qty), amount_text(rng, price), amount_text(rng, qty * price)]
+        if rng.random() < 0.05:
+            row[3] = row[3][0] + row[3][1:].replace("0", "O").replace("1", "l")  # Misread digits
+        if rng.random() < 0.05:
+            row = row[:int(rng.integers(3, 6))]  # Ragged row
+        table.append(row)
+    return table
+
+
+def legacy_cleanup(rows):
+    """The cleanup both OCR services used before table_cleanup"""
+    row_lengths = [len(row) for row in rows]
+    num_columns = max(set(row_lengths), key=row_lengths.count)
+    normalized_rows = []
+    for row in rows:
+        row = [str(item) if item else '' for item in row]
+        if len(row) < num_columns:
+            row.extend([''] * (num_columns - len(row)))
+        elif len(row) > num_columns:
+            row = row[:num_columns]
+        normalized_rows.append(row)
+    df = pd.DataFrame(normalized_rows[1:], columns=normalized_rows[0]).replace('', np.nan)
+    for col in df.columns:
+        converted = pd.to_numeric(df[col], errors='coerce')
+        if converted[df[col].notna()].notna().all():
+            df[col] = converted
+    return df
+
+
+def check_dotted_thousands():
+    """A column of bare "12.500"-style amounts must not take the to_numeric fast path"""
+    df = normalize_table([["Harga"], ["12.500"], ["7.500"], ["150"]])
+    values = df["Harga"].tolist()
+    assert values == [12500, 7500, 150], f"dotted thousands misread: {values}"
+    print(f"✅ Dotted thousands read as Rupiah: {values}")
+
+
+def timed(function, tables):
+    timings = []
+    for rows in tables:
+        started = time.perf_counter()
+        df = function(rows)
+        timings.append((time.perf_counter() - started) * 1000)
+    return df, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ledger table cleanup")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--tables", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    check_dotted_thousands()
+
+    rng = np.random.default_rng(args.seed)
+    tables = [synthetic_ledger(rng, args.rows) for _ in range(args.tables)]
+
+    print(f"📄 {args.tables} tables, {args.rows} rows each")
+    for label, function in (("legacy", legacy_cleanup), ("normalize_table", normalize_table)):
+        df, timings = timed(function, tables)
+        typed = ", ".join(f"{name}={dtype}" for name, dtype in df.dtypes.items())
+        print(f"   {label:>15}: median {statistics.median(timings):7.1f} ms, max {max(timings):7.1f} ms  [{typed}]")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark table reconstruction on synthetic ledger pages
+
+Generates pages of jittered word boxes (with repeated cell texts and
+split words, like handwritten ledgers) and times reconstruct_table.
+
+Usage:
+    python backend/scripts/bench_table_reconstruction.py --rows 300 --cols 12 --pages 20
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.services.table_reconstruction import reconstruct_table
+
+
+def synthetic_page(rng: np.random.Generator, rows: int, cols: int):
+    """(text, (y, x), confidence) words laid out on a rows x cols grid"""
+    words = []
+    for r in range(rows):
+        for c in range(cols):
+            if rng.random() < 0.1:
+                continue  # Empty cell
+            y = int(40 + r * 35 + rng.integers(-4, 5))
+            x = int(60 + c * 150 + rng.integers(-6, 7))
+            words.append((str(rng.integers(0, 100)), (y, x), float(rng.uniform(0.3, 1))))
+            if rng.random() < 0.3:
+                words.append(("rb", (y + 1, x + 30), 0.9))  # Second word in the cell
+    rng.shuffle(words)
+    return words
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark table reconstruction")
+    parser.add_argument("--rows", type=int, default=300)
+    parser.add_argument("--cols", type=int, default=12)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(args.seed)
+    pages = [synthetic_page(rng, args.rows, args.cols) for _ in range(args.pages)]
+    
+    timings = []
+    for words in pages:
+        started = time.perf_counter()
+        table = reconstruct_table(words)
+        timings.append((time.perf_counter() - started) * 1000)
+    
+    words_per_page = statistics.mean(len(words) for words in pages)
+    print(f"📄 {args.pages} pages, ~{words_per_page:.0f} words each -> {len(table)} rows x {max(map(len, table))} cols")
+    print(f"   median {statistics.median(timings):.2f} ms, max {max(timings):.2f} ms per page")
+
+if __name__ == "__main__":
+    main()
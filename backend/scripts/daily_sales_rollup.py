@@ -0,0 +1,60 @@
+"""
+Maintenance script for the daily_product_sales rollup
+
+Usage:
+    python backend/scripts/daily_sales_rollup.py backfill [--since YYYY-MM-DD]
+    python backend/scripts/daily_sales_rollup.py check [--since YYYY-MM-DD]
+"""
+
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+load_dotenv()
+
+from backend.models.database import Base, SessionLocal, engine
+from backend.services.sales_rollup import (backfill_daily_sales,
+                                           check_daily_sales_consistency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill or verify the daily sales rollup")
+    parser.add_argument("command", choices=["backfill", "check"])
+    parser.add_argument("--since", type=date.fromisoformat, default=None,
+                        help="Only touch days on or after this date")
+    args = parser.parse_args()
+    
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    
+    try:
+        if args.command == "backfill":
+            print("📦 Rebuilding daily_product_sales from stock_movements...")
+            rows = backfill_daily_sales(db, args.since)
+            print(f"   ✅ {rows} rollup rows written")
+        
+        print("🔍 Checking rollup against the stock ledger...")
+        mismatches = check_daily_sales_consistency(db, args.since)
+        if not mismatches:
+            print("   ✅ Rollup matches the ledger")
+            return
+        
+        print(f"   ❌ {len(mismatches)} mismatched product-days")
+        for mismatch in mismatches[:20]:
+            print(
+                f"      product {mismatch['product_id']} on {mismatch['sale_date']}: "
+                f"ledger {mismatch['ledger_quantity']} ({mismatch['ledger_transactions']} tx) vs "
+                f"rollup {mismatch['rollup_quantity']} ({mismatch['rollup_transactions']} tx)"
+            )
+        sys.exit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
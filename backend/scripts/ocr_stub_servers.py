@@ -0,0 +1,161 @@
+"""
+Local stubs of the Google Cloud Vision and Gemini REST APIs for benchmarks
+
+Vision answers POST /v1/images:annotate and Gemini answers
+POST /v1beta/models/<model>:generateContent with a small fixed ledger
+page, after a latency drawn per request: `latency` seconds, or
+`tail_latency` with probability `tail_rate`. With probability
+`error_rate` the stub answers 503 instead.
+
+Usage:
+    python backend/scripts/ocr_stub_servers.py --vision-tail-rate 0.1 --vision-tail-latency 8
+    GOOGLE_VISION_ENDPOINT=http://127.0.0.1:8021 GEMINI_ENDPOINT=http://127.0.0.1:8022 \
+        GEMINI_API_KEY=stub uvicorn ...
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# (text, row, column) of the stub page
+STUB_WORDS = [
+    ("Tanggal", 1, 1), ("Barang", 1, 8), ("Jumlah", 1, 16), ("Harga", 1, 22),
+    ("01/10", 2, 1), ("Beras", 2, 8), ("5", 2, 16), ("75000", 2, 22),
+    ("02/10", 3, 1), ("Gula", 3, 8), ("3", 3, 16), ("42000", 3, 22),
+    ("03/10", 4, 1), ("Minyak", 4, 8), ("2", 4, 16), ("36000", 4, 22)
+]
+
+
+@dataclass
+class LatencyProfile:
+    latency: float = 0.3
+    tail_latency: float = 5.0
+    tail_rate: float = 0.0
+    error_rate: float = 0.0
+
+    def draw(self) -> float:
+        return self.tail_latency if random.random() < self.tail_rate else self.latency
+
+
+def vision_response() -> dict:
+    words = []
+    for text, row, col in STUB_WORDS:
+        y, x = row * 20, col * 20
+        words.append({
+            "boundingBox": {"vertices": [
+                {"x": x - 8, "y": y - 6}, {"x": x + 8, "y": y - 6},
+                {"x": x + 8, "y": y + 6}, {"x": x - 8, "y": y + 6}
+            ]},
+            "symbols": [{"text": char, "confidence": 0.95} for char in text]
+        })
+    return {"responses": [{
+        "fullTextAnnotation": {
+            "pages": [{"blocks": [{"paragraphs": [{"words": words}]}]}],
+            "text": " ".join(text for text, _, _ in STUB_WORDS)
+        }
+    }]}
+
+
+def gemini_response() -> dict:
+    text = "\n".join(f"{word}|{row}|{col}|92" for word, row, col in STUB_WORDS)
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": "STOP",
+            "index": 0
+        }],
+        "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": 0, "totalTokenCount": 0}
+    }
+
+
+def make_handler(path_suffix: str, build_response, profile: LatencyProfile):
+    class StubOCRHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.split("?")[0].endswith(path_suffix):
+                self.send_error(404)
+                return
+
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(profile.draw())
+
+            if random.random() < profile.error_rate:
+                status = 503
+                payload = json.dumps({"error": {"code": 503, "message": "stub unavailable", "status": "UNAVAILABLE"}})
+            else:
+                status = 200
+                payload = json.dumps(build_response())
+            payload = payload.encode("utf-8")
+
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Client hit its deadline and hung up
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubOCRHandler
+
+
+def _start(port: int, handler) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_vision_stub(port: int = 0, profile: LatencyProfile = None) -> ThreadingHTTPServer:
+    """Start the Vision stub in a daemon thread; the bound port is server.server_port"""
+    return _start(port, make_handler("/images:annotate", vision_response, profile or LatencyProfile()))
+
+
+def start_gemini_stub(port: int = 0, profile: LatencyProfile = None) -> ThreadingHTTPServer:
+    """Start the Gemini stub in a daemon thread; the bound port is server.server_port"""
+    return _start(port, make_handler(":generateContent", gemini_response, profile or LatencyProfile()))
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser, name: str, latency: float):
+    parser.add_argument(f"--{name}-latency", type=float, default=latency, help="Usual seconds to answer")
+    parser.add_argument(f"--{name}-tail-latency", type=float, default=5.0, help="Seconds to answer in the slow tail")
+    parser.add_argument(f"--{name}-tail-rate", type=float, default=0.0, help="Share of requests in the slow tail")
+    parser.add_argument(f"--{name}-error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+
+
+def profile_from_args(args: argparse.Namespace, name: str) -> LatencyProfile:
+    name = name.replace("-", "_")
+    return LatencyProfile(
+        latency=getattr(args, f"{name}_latency"),
+        tail_latency=getattr(args, f"{name}_tail_latency"),
+        tail_rate=getattr(args, f"{name}_tail_rate"),
+        error_rate=getattr(args, f"{name}_error_rate")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Google Cloud Vision and Gemini REST servers")
+    parser.add_argument("--vision-port", type=int, default=8021)
+    parser.add_argument("--gemini-port", type=int, default=8022)
+    add_profile_arguments(parser, "vision", 0.3)
+    add_profile_arguments(parser, "gemini", 0.8)
+    args = parser.parse_args()
+
+    start_vision_stub(args.vision_port, profile_from_args(args, "vision"))
+    start_gemini_stub(args.gemini_port, profile_from_args(args, "gemini"))
+    print(f"👁️ Stub Vision listening on http://127.0.0.1:{args.vision_port}")
+    print(f"✨ Stub Gemini listening on http://127.0.0.1:{args.gemini_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Stock ledger snapshots - checkpoint, verify and point-in-time lookup
+
+Run `snapshot` daily (e.g. from cron) to checkpoint the ledger.
+
+Usage:
+    python backend/scripts/stock_snapshots.py snapshot [--settle-seconds 300]
+    python backend/scripts/stock_snapshots.py verify
+    python backend/scripts/stock_snapshots.py stock-at --product 12 --at 2025-01-31T23:59:59
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+load_dotenv()
+
+from backend.models.database import Base, SessionLocal, engine
+from backend.services.stock_snapshots import (SETTLE_SECONDS, create_snapshots,
+                                              stock_at, verify_ledger)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stock ledger snapshots")
+    parser.add_argument("command", choices=["snapshot", "verify", "stock-at"])
+    parser.add_argument("--settle-seconds", type=int, default=SETTLE_SECONDS,
+                        help="Leave out movements newer than this (snapshot)")
+    parser.add_argument("--product", type=int, help="Product id (stock-at)")
+    parser.add_argument("--at", type=datetime.fromisoformat, help="Moment to look up (stock-at)")
+    args = parser.parse_args()
+    
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    
+    try:
+        if args.command == "snapshot":
+            print("📸 Checkpointing stock ledger...")
+            run = create_snapshots(db, args.settle_seconds)
+            print(f"   ✅ {run['snapshots']} product snapshots up to movement {run['last_movement_id']}")
+            return
+        
+        if args.command == "stock-at":
+            if args.product is None or args.at is None:
+                parser.error("stock-at needs --product and --at")
+            result = stock_at(db, args.product, args.at)
+            if result is None:
+                print(f"❌ Product {args.product} not found")
+                sys.exit(1)
+            source = f"snapshot at {result['snapshot_at']}" if result["snapshot_at"] else "ledger start"
+            print(f"📦 Product {args.product} at {result['at']}: {result['stock']} "
+                  f"({source} + {result['movements_applied']} movements)")
+            return
+        
+        print("🔍 Checking current stock against the ledger...")
+        mismatches = verify_ledger(db)
+        if not mismatches:
+            print("   ✅ Current stock matches the ledger")
+            return
+        
+        print(f"   ❌ {len(mismatches)} products disagree with the ledger")
+        for mismatch in mismatches[:20]:
+            print(
+                f"      product {mismatch['product_id']}: current {mismatch['current_stock']} vs "
+                f"ledger {mismatch['ledger_stock']} (diff {mismatch['difference']:+})"
+            )
+        sys.exit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Local stub of the OpenAI chat completions API for tests and benchmarks
+
+Answers POST /v1/chat/completions with an OpenAI-shaped response whose
+content is the regex parse of the invoice text, after an artificial delay.
+
+Usage:
+    python backend/scripts/stub_llm_server.py --port 8011 --latency 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8011/v1 OPENAI_API_KEY=stub uvicorn ...
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.services.invoice_parser import parse_invoice_regex
+
+
+def make_handler(latency: float):
+    class StubLLMHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            text = body.get("messages", [{}])[-1].get("content", "")
+            time.sleep(latency)
+            
+            payload = json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": json.dumps(parse_invoice_regex(text))},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            }).encode("utf-8")
+            
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Client hit its deadline and hung up
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return StubLLMHandler
+
+
+def start_stub_llm_server(port: int = 0, latency: float = 0.0) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread; the bound port is server.server_port"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds to wait before answering")
+    args = parser.parse_args()
+    
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.latency))
+    print(f"🤖 Stub LLM listening on http://127.0.0.1:{args.port}/v1 (latency {args.latency}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
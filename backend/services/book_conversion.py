@@ -0,0 +1,264 @@
+"""
+Book conversion - multi-page ledgers (PDF, zip, image batches) to one workbook
+
+Inputs are expanded into pages lazily: PDF pages are rasterized with
+PyMuPDF and zip members are extracted only when a worker slot frees up,
+so at most BOOK_PAGE_WORKERS * 2 pages are in memory or on disk at once.
+Pages are OCR'd in parallel and written to the workbook in page order as
+they finish (openpyxl write-only mode, rows are never held for the whole
+book), either one sheet per page or one merged sheet with a page column.
+A closing "Ringkasan" sheet lists every page with its status and timing.
+"""
+
+import os
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from openpyxl import Workbook
+
+from backend.services.table_export import cell_value, column_widths, frame_table, set_column_widths
+
+try:
+    import fitz  # PyMuPDF
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp'}
+LAYOUTS = ("sheets", "merged")
+
+
+@dataclass
+class PageSource:
+    number: int
+    source: str                          # e.g. "buku.pdf#3" or "scan.zip/hal2.jpg"
+    materialize: Callable[[Path], Path]  # write the page image under a directory, return its path
+    temporary: bool                      # remove the image once the page is done
+
+
+def _pdf_pages(path: Path, dpi: int) -> Iterator[Tuple[str, Callable[[Path], Path]]]:
+    if not PDF_AVAILABLE:
+        raise RuntimeError("PDF support requires PyMuPDF (pip install pymupdf)")
+
+    document = fitz.open(str(path))
+    try:
+        for index in range(document.page_count):
+            def rasterize(directory: Path, index=index) -> Path:
+                image_path = directory / f"{path.stem}_p{index + 1:04d}.png"
+                document.load_page(index).get_pixmap(dpi=dpi).save(str(image_path))
+                return image_path
+            yield f"{path.name}#{index + 1}", rasterize
+    finally:
+        document.close()
+
+
+def _zip_pages(path: Path) -> Iterator[Tuple[str, Callable[[Path], Path]]]:
+    with zipfile.ZipFile(path) as archive:
+        members = sorted(
+            member for member in archive.namelist()
+            if Path(member).suffix.lower() in IMAGE_EXTENSIONS and not member.startswith('__MACOSX/')
+        )
+        for index, member in enumerate(members):
+            def extract(directory: Path, member=member, index=index) -> Path:
+                image_path = directory / f"{path.stem}_z{index + 1:04d}{Path(member).suffix.lower()}"
+                with archive.open(member) as source, open(image_path, 'wb') as target:
+                    while chunk := source.read(1 << 20):
+                        target.write(chunk)
+                return image_path
+            yield f"{path.name}/{member}", extract
+
+
+def iter_pages(inputs: List[Path], dpi: Optional[int] = None) -> Iterator[PageSource]:
+    """
+    Pages of every input, in order: PDFs page by page, zips by member name,
+    images as single pages. Raises ValueError for unsupported files
+    """
+    dpi = dpi or int(os.getenv('BOOK_PDF_DPI', '200'))
+    number = 0
+    for path in inputs:
+        suffix = path.suffix.lower()
+        if suffix == '.pdf':
+            pages, temporary = _pdf_pages(path, dpi), True
+        elif suffix == '.zip':
+            pages, temporary = _zip_pages(path), True
+        elif suffix in IMAGE_EXTENSIONS:
+            pages, temporary = [(path.name, lambda directory, path=path: path)], False
+        else:
+            raise ValueError(f"Unsupported file type: {path.name}")
+
+        for source, materialize in pages:
+            number += 1
+            yield PageSource(number, source, materialize, temporary)
+
+
+class BookWorkbookWriter:
+    """
+    Streams page tables into a write-only workbook, in page order
+    """
+
+    def __init__(self, path: Path, layout: str = "sheets"):
+        if layout not in LAYOUTS:
+            raise ValueError(f"layout must be one of {', '.join(LAYOUTS)}")
+        self.path = path
+        self.layout = layout
+        self.workbook = Workbook(write_only=True)
+        self.merged = None
+        self.merged_header = None
+
+    def add_page(self, number: int, df: pd.DataFrame):
+        header, rows = frame_table(df)
+
+        if self.layout == "sheets":
+            sheet = self.workbook.create_sheet(f"Halaman {number}")
+            set_column_widths(sheet, column_widths(header, rows))
+            sheet.append(header)
+            for row in rows:
+                sheet.append([cell_value(value) for value in row])
+            return
+
+        if self.merged is None:
+            self.merged = self.workbook.create_sheet("Laporan")
+            self.merged.column_dimensions['A'].width = 10
+            set_column_widths(self.merged, column_widths(header, rows), offset=1)
+        if header != self.merged_header:
+            # Pages with a different header get their own header row
+            self.merged.append(["Halaman"] + header)
+            self.merged_header = header
+        for row in rows:
+            self.merged.append([number] + [cell_value(value) for value in row])
+
+    def close(self, pages: List[Dict]):
+        """Write the per-page summary sheet and save"""
+        summary = self.workbook.create_sheet("Ringkasan")
+        fields = ["page", "source", "status", "rows", "columns", "confidence", "backend", "prepare_ms", "ocr_ms", "error"]
+        for column, width in zip("ABCDEFGHIJ", (8, 40, 10, 8, 8, 12, 16, 12, 10, 40)):
+            summary.column_dimensions[column].width = width
+        summary.append(fields)
+        for page in pages:
+            summary.append([page.get(field) for field in fields])
+        self.workbook.save(str(self.path))
+
+
+def _ocr_page(ocr, page: PageSource, image_path: Path, prepare_ms: float) -> Tuple[Dict, Optional[pd.DataFrame]]:
+    started = time.perf_counter()
+    try:
+        result = ocr.extract_table_from_image(str(image_path))
+    finally:
+        if page.temporary and image_path.exists():
+            os.remove(image_path)
+    ocr_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    info = {
+        "page": page.number,
+        "source": page.source,
+        "status": "ok" if result["success"] else "failed",
+        "rows": result["rows_extracted"],
+        "columns": result["columns_detected"],
+        "confidence": round(result["confidence"] * 100, 2),
+        "backend": result.get("backend"),
+        "prepare_ms": prepare_ms,
+        "ocr_ms": ocr_ms,
+        "error": result.get("error")
+    }
+    return info, result["data"] if result["success"] else None
+
+
+def _failed_page(page: PageSource, error: Exception) -> Tuple[Dict, None]:
+    return {
+        "page": page.number, "source": page.source, "status": "failed",
+        "rows": 0, "columns": 0, "confidence": 0, "backend": None,
+        "prepare_ms": None, "ocr_ms": None, "error": str(error)
+    }, None
+
+
+def convert_book(
+    ocr,
+    inputs: List[Path],
+    work_dir: Path,
+    excel_path: Path,
+    layout: str = "sheets",
+    workers: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    on_page: Optional[Callable[[Dict], None]] = None
+) -> Dict:
+    """
+    OCR every page of the inputs in parallel and write one workbook
+    on_page is called with each page's summary as soon as it is written
+    Returns {"pages", "pages_total", "pages_succeeded", "rows_extracted", "elapsed_ms"}
+    """
+    workers = workers or int(os.getenv('BOOK_PAGE_WORKERS', '4'))
+    max_pages = max_pages or int(os.getenv('BOOK_MAX_PAGES', '200'))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    writer = BookWorkbookWriter(excel_path, layout)
+
+    started = time.perf_counter()
+    pages = iter_pages(inputs)
+    pending = {}
+    finished: Dict[int, Tuple[Dict, Optional[pd.DataFrame]]] = {}
+    summaries: List[Dict] = []
+    next_page = 1
+    exhausted = False
+
+    def write_ready():
+        nonlocal next_page
+        while next_page in finished:
+            info, df = finished.pop(next_page)
+            if df is not None:
+                writer.add_page(next_page, df)
+            summaries.append(info)
+            print(f"[BOOK] Page {info['page']} ({info['source']}): {info['status']}, "
+                  f"{info['rows']} rows, {info['ocr_ms'] or 0:.0f} ms")
+            if on_page:
+                on_page(info)
+            next_page += 1
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="book-page") as executor:
+        while True:
+            # Keep the window full; pages are only materialized when there is room
+            while not exhausted and len(pending) + len(finished) < workers * 2:
+                page = next(pages, None)
+                if page is None:
+                    exhausted = True
+                    break
+                if page.number > max_pages:
+                    raise ValueError(f"Too many pages (max {max_pages})")
+
+                prepare_started = time.perf_counter()
+                try:
+                    image_path = page.materialize(work_dir)
+                except Exception as e:
+                    # An unreadable page (e.g. a corrupt PDF page) fails alone, like an OCR error
+                    finished[page.number] = _failed_page(page, e)
+                    continue
+                prepare_ms = round((time.perf_counter() - prepare_started) * 1000, 1)
+                pending[executor.submit(_ocr_page, ocr, page, image_path, prepare_ms)] = page
+
+            if not pending:
+                write_ready()
+                break
+
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                page = pending.pop(future)
+                try:
+                    finished[page.number] = future.result()
+                except Exception as e:
+                    finished[page.number] = _failed_page(page, e)
+            write_ready()
+
+    if not summaries:
+        raise ValueError("No pages found in the uploaded files")
+
+    writer.close(summaries)
+    return {
+        "pages": summaries,
+        "pages_total": len(summaries),
+        "pages_succeeded": sum(1 for page in summaries if page["status"] == "ok"),
+        "rows_extracted": sum(page["rows"] for page in summaries),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
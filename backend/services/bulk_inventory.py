@@ -0,0 +1,123 @@
+"""
+Bulk inventory input - reading and validating CSV / JSON row batches
+
+Used by the bulk product import and bulk stock adjustment endpoints.
+Rows are validated all at once; invalid rows are reported by row number
+and the valid ones go on to a single set-based write.
+"""
+
+import csv
+import io
+import json
+from typing import Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError, field_validator, model_validator
+
+MOVEMENT_TYPES = ("restock", "adjustment", "sale")
+
+
+class ProductRow(BaseModel):
+    name: str
+    category: Optional[str] = None
+    unit: str = "pcs"
+    price: float
+    current_stock: float = 0
+    min_stock: float = 10
+
+    @field_validator("name")
+    @classmethod
+    def name_not_blank(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("name is required")
+        return value
+
+    @field_validator("price", "min_stock")
+    @classmethod
+    def not_negative(cls, value: float) -> float:
+        if value < 0:
+            raise ValueError("must not be negative")
+        return value
+
+
+class StockRow(BaseModel):
+    """One stock change: a delta (quantity) or a physical count (counted_stock)"""
+    product_id: Optional[int] = None
+    name: Optional[str] = None
+    quantity: Optional[float] = None
+    counted_stock: Optional[float] = None
+    movement_type: str = "adjustment"
+    notes: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_row(self):
+        if (self.product_id is None) == (not self.name):
+            raise ValueError("give either product_id or name")
+        if (self.quantity is None) == (self.counted_stock is None):
+            raise ValueError("give either quantity or counted_stock")
+        if self.counted_stock is not None and self.counted_stock < 0:
+            raise ValueError("counted_stock must not be negative")
+        if self.movement_type not in MOVEMENT_TYPES:
+            raise ValueError(f"movement_type must be one of {', '.join(MOVEMENT_TYPES)}")
+        if self.name:
+            self.name = self.name.strip()
+        return self
+
+
+def read_rows(content: bytes, content_type: Optional[str] = None, filename: Optional[str] = None) -> List[Dict]:
+    """
+    Decode a JSON array or a CSV file (with header) into row dicts
+    Raises ValueError if the payload is neither
+    """
+    text = content.decode("utf-8-sig").strip()
+    if not text:
+        return []
+
+    is_json = (content_type or "").endswith("json") or (filename or "").lower().endswith(".json")
+    if is_json or (text[0] in "[{" and not (filename or "").lower().endswith(".csv")):
+        try:
+            rows = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if isinstance(rows, dict):
+            rows = rows.get("rows") or rows.get("items") or []
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("JSON body must be an array of objects")
+        return rows
+
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames:
+        raise ValueError("CSV header row is missing")
+    reader.fieldnames = [field.strip().lower() for field in reader.fieldnames]
+
+    # Empty CSV cells mean "not given", so model defaults apply
+    return [
+        {key: value.strip() for key, value in row.items() if key and value is not None and value.strip() != ""}
+        for row in reader
+    ]
+
+
+def _error_message(error: ValidationError) -> str:
+    messages = []
+    for detail in error.errors():
+        field = ".".join(str(part) for part in detail["loc"])
+        message = detail["msg"].removeprefix("Value error, ")
+        messages.append(f"{field}: {message}" if field else message)
+    return "; ".join(messages)
+
+
+def validate_rows(rows: List[Dict], model: Type[BaseModel]) -> Tuple[List[Tuple[int, BaseModel]], List[Dict]]:
+    """
+    Validate every row against model
+    Returns ([(row_number, parsed)], [{"row", "error"}]); rows are numbered from 1
+    """
+    valid = []
+    errors = []
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            valid.append((row_number, model(**row)))
+        except ValidationError as e:
+            errors.append({"row": row_number, "error": _error_message(e)})
+        except TypeError:
+            errors.append({"row": row_number, "error": "Row must be an object"})
+    return valid, errors
@@ -3,14 +3,46 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import func, case, update, insert
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import json
 import os
+import random
+import time
 
-from backend.models.database import Product, StockMovement, Invoice, PaymentItem, Payment
+import numpy as np
+import pandas as pd
+
+from backend.models.database import (
+    Product, StockMovement, Invoice, PaymentItem, Payment, DailyProductSales, StockReservation,
+    dialect_insert
+)
 from backend.services.payment_ocr import PaymentOCR
+from backend.services.sales_rollup import record_daily_sales
+from backend.services.demand_forecaster import DemandForecaster, flat_window
+from backend.services.product_name_index import ProductNameIndex
+from backend.services.invoice_parser import InvoiceParser, parse_invoice_regex
+from backend.services.stock_alerts import StockAlerts, stock_status, stock_status_expression
+from backend.services.bulk_inventory import ProductRow, StockRow, validate_rows
+from backend.services.inventory_totals import InventoryTotals
+from backend.services.stock_reservations import ReservationBook, ACTIVE, CONVERTED, RELEASED, EXPIRED
+
+
+class StockConflictError(RuntimeError):
+    """Raised when a stock update keeps losing the compare-and-swap race"""
+
+
+BULK_CHUNK_SIZE = 500  # Rows per IN list / multi-row INSERT
+
+
+def _chunks(items: List, size: int = BULK_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
 
 class InventoryManager:
     """
@@ -19,191 +51,668 @@ class InventoryManager:
     
     def __init__(self):
         self.ocr = PaymentOCR()
+        self.ocr_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("OCR_WORKERS", "2")),
+            thread_name_prefix="invoice-ocr"
+        )
         self.low_stock_threshold = int(os.getenv("LOW_STOCK_THRESHOLD", "10"))
         self.forecast_days = int(os.getenv("FORECAST_DAYS", "7"))
+        self.stock_update_retries = int(os.getenv("STOCK_UPDATE_RETRIES", "5"))
+        self.invoice_parser = InvoiceParser()
+        self.name_index = ProductNameIndex(
+            min_score=float(os.getenv("PRODUCT_MATCH_MIN_SCORE", "0.3"))
+        )
+        self.forecaster = DemandForecaster(
+            method=os.getenv("FORECAST_METHOD", "flat"),
+            history_days=int(os.getenv("FORECAST_HISTORY_DAYS", "56"))
+        )
+        self.stock_alerts = StockAlerts()
+        self.inventory_totals = InventoryTotals()
+        self.reservations = ReservationBook()
+        self.reservation_ttl_seconds = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
     
-    async def process_invoice_image(self, image_path: str, db: Session) -> Dict:
+    def _with_stock_retries(self, db: Session, operation: Callable):
         """
-        Process supplier invoice using OCR + LLM
-        Extracts items and quantities to update inventory
-        """
-        # Extract text using OCR
-        ocr_result = self.ocr.extract_text(image_path)
-        full_text = ' '.join([result[1] for result in ocr_result])
+        Run a stock-changing operation and commit it.
         
-        # Parse with LLM (using OpenAI or Gemini)
-        parsed_items = await self._parse_invoice_with_llm(full_text)
+        Product rows are versioned, so a concurrent writer makes the
+        UPDATE match zero rows and the flush raises StaleDataError. The
+        transaction is then rolled back and the operation re-run against
+        fresh rows, with jittered backoff, up to stock_update_retries times.
+        """
+        for attempt in range(self.stock_update_retries):
+            try:
+                result = operation()
+                db.commit()
+                return result
+            except StaleDataError:
+                db.rollback()
+                time.sleep(random.uniform(0, 0.005 * (2 ** attempt)))
         
-        # Create invoice record
-        invoice = Invoice(
-            image_path=image_path,
-            ocr_text=full_text,
-            parsed_items=json.dumps(parsed_items),
-            invoice_date=datetime.utcnow(),
-            is_processed=False
+        raise StockConflictError(
+            f"Stock update still conflicting after {self.stock_update_retries} attempts"
         )
+    
+    def record_stock_changes(self, changed: Dict[int, tuple]):
+        """
+        Write committed stock levels through to the alert set and totals
+        changed: {product_id: (name, unit, current_stock, min_stock, price)}
+        """
+        for product_id, (name, unit, current_stock, min_stock, price) in changed.items():
+            self.stock_alerts.track(product_id, name, unit, current_stock, min_stock)
+            self.inventory_totals.track(product_id, current_stock, price)
+    
+    def adjust_stock(
+        self,
+        db: Session,
+        product_id: int,
+        quantity: float,
+        movement_type: str,
+        notes: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Manually adjust stock (restock or correction)
+        Returns None if the product does not exist
+        """
+        changed = {}
         
-        db.add(invoice)
+        def apply():
+            changed.clear()
+            product = db.query(Product).filter(Product.id == product_id).first()
+            if not product:
+                return None
+            
+            previous_stock = product.current_stock
+            new_stock = previous_stock + quantity
+            
+            # Create stock movement record
+            movement = StockMovement(
+                product_id=product.id,
+                movement_type=movement_type,
+                quantity=quantity,
+                previous_stock=previous_stock,
+                new_stock=new_stock,
+                reference_type="manual",
+                notes=notes
+            )
+            
+            product.current_stock = new_stock
+            product.stock_status = stock_status(new_stock, product.min_stock)
+            changed[product.id] = (product.name, product.unit, new_stock, product.min_stock, product.price)
+            if movement_type == "restock":
+                product.last_restocked_at = datetime.utcnow()
+            
+            db.add(movement)
+            db.flush()  # Version check happens here
+            if movement_type == "sale":
+                record_daily_sales(db, [{
+                    "product_id": product.id,
+                    "quantity": quantity,
+                    "created_at": movement.created_at
+                }])
+            
+            return {
+                "product": product.name,
+                "previous_stock": previous_stock,
+                "new_stock": new_stock
+            }
+        
+        result = self._with_stock_retries(db, apply)
+        self.record_stock_changes(changed)
+        return result
+    
+    def import_products(self, db: Session, rows: List[Dict]) -> Dict:
+        """
+        Create or update many products at once (upsert on name)
+        
+        New products start with their current_stock. For existing ones
+        only category, unit, price and min_stock are updated; stock is
+        changed through bulk_adjust_stock so the ledger stays complete.
+        """
+        valid, errors = validate_rows(rows, ProductRow)
+        
+        products = []
+        first_row = {}
+        for row_number, product in valid:
+            if product.name in first_row:
+                errors.append({"row": row_number, "error": f"Duplicate of row {first_row[product.name]}"})
+                continue
+            first_row[product.name] = row_number
+            products.append(product)
+        
+        errors.sort(key=lambda error: error["row"])
+        if not products:
+            return {"created": 0, "updated": 0, "failed": len(errors), "errors": errors}
+        
+        names = [product.name for product in products]
+        existing = set()
+        for chunk in _chunks(names):
+            existing.update(name for (name,) in db.query(Product.name).filter(Product.name.in_(chunk)))
+        
+        table = Product.__table__
+        stmt = dialect_insert(db, table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={
+                "category": stmt.excluded.category,
+                "unit": stmt.excluded.unit,
+                "price": stmt.excluded.price,
+                "min_stock": stmt.excluded.min_stock,
+                "stock_status": stock_status_expression(table.c.current_stock, stmt.excluded.min_stock),
+                "version": table.c.version + 1
+            }
+        )
+        now = datetime.utcnow()
+        for chunk in _chunks(products):
+            db.execute(stmt, [
+                {
+                    **product.model_dump(),
+                    "stock_status": stock_status(product.current_stock, product.min_stock),
+                    "total_sold": 0,
+                    "created_at": now,
+                    "version": 1
+                }
+                for product in chunk
+            ])
         db.commit()
-        db.refresh(invoice)
         
-        # Update inventory
-        items_added = 0
-        for item in parsed_items:
-            product = db.query(Product).filter(
-                Product.name.ilike(f"%{item['name']}%")
-            ).first()
-            
-            if product:
-                # Update existing product stock
-                previous_stock = product.current_stock
-                new_stock = previous_stock + item['quantity']
-                
-                movement = StockMovement(
-                    product_id=product.id,
-                    movement_type="restock",
-                    quantity=item['quantity'],
-                    previous_stock=previous_stock,
-                    new_stock=new_stock,
-                    reference_type="invoice",
-                    reference_id=invoice.id,
-                    notes=f"Restocked from invoice {invoice.id}"
-                )
+        # Keep the name index, alert set and totals in step with the table
+        changed = {}
+        for chunk in _chunks(names):
+            for row in db.query(
+                Product.id, Product.name, Product.unit, Product.current_stock,
+                Product.min_stock, Product.price
+            ).filter(Product.name.in_(chunk)):
+                self.name_index.add(row.id, row.name)
+                changed[row.id] = (row.name, row.unit, row.current_stock, row.min_stock, row.price)
+        self.record_stock_changes(changed)
+        
+        return {
+            "created": len(products) - len(existing),
+            "updated": len(existing),
+            "failed": len(errors),
+            "errors": errors
+        }
+    
+    def bulk_adjust_stock(self, db: Session, rows: List[Dict]) -> Dict:
+        """
+        Apply many stock changes (e.g. a stock opname) in one transaction
+        
+        Each row names a product by product_id or name and gives either a
+        delta (quantity) or a physical count (counted_stock, recorded as
+        an adjustment by the difference). Rows for the same product apply
+        in order. Stock is swapped with one versioned UPDATE and all ledger
+        rows are bulk-inserted.
+        """
+        valid, errors = validate_rows(rows, StockRow)
+        
+        # Resolve product names to ids with one query per chunk
+        names = list({row.name for _, row in valid if row.name})
+        ids_by_name = {}
+        for chunk in _chunks(names):
+            ids_by_name.update({name: product_id for product_id, name in db.query(
+                Product.id, Product.name
+            ).filter(Product.name.in_(chunk))})
+        
+        requested_ids = list({row.product_id for _, row in valid if row.product_id is not None})
+        known_ids = set()
+        for chunk in _chunks(requested_ids):
+            known_ids.update(product_id for (product_id,) in db.query(Product.id).filter(Product.id.in_(chunk)))
+        
+        resolved = []
+        for row_number, row in valid:
+            product_id = row.product_id if row.product_id is not None else ids_by_name.get(row.name)
+            if product_id is None or (row.product_id is not None and product_id not in known_ids):
+                errors.append({"row": row_number, "error": f"Product not found: {row.product_id or row.name}"})
+                continue
+            resolved.append((product_id, row))
+        
+        errors.sort(key=lambda error: error["row"])
+        product_ids = list({product_id for product_id, _ in resolved})
+        changed = {}
+        
+        def apply():
+            changed.clear()
+            products = {}
+            for chunk in _chunks(product_ids):
+                products.update({
+                    product.id: product
+                    for product in db.query(Product).filter(Product.id.in_(chunk))
+                })
+            
+            stock = {product_id: products[product_id].current_stock or 0 for product_id in product_ids}
+            before = dict(stock)
+            now = datetime.utcnow()
+            movements = []
+            restocked = set()
+            
+            for product_id, row in resolved:
+                previous_stock = stock[product_id]
+                if row.counted_stock is not None:
+                    quantity = row.counted_stock - previous_stock
+                    notes = row.notes or f"Stock count: {row.counted_stock}"
+                else:
+                    quantity = row.quantity
+                    notes = row.notes
+                new_stock = previous_stock + quantity
+                stock[product_id] = new_stock
+                if row.movement_type == "restock":
+                    restocked.add(product_id)
                 
-                product.current_stock = new_stock
-                product.last_restocked_at = datetime.utcnow()
+                movements.append({
+                    "product_id": product_id,
+                    "movement_type": row.movement_type,
+                    "quantity": quantity,
+                    "previous_stock": previous_stock,
+                    "new_stock": new_stock,
+                    "reference_type": "bulk",
+                    "reference_id": None,
+                    "notes": notes,
+                    "created_at": now
+                })
+            
+            products_table = Product.__table__
+            for chunk in _chunks(product_ids):
+                values = {
+                    "current_stock": case({pid: stock[pid] for pid in chunk}, value=products_table.c.id),
+                    "stock_status": case(
+                        {pid: stock_status(stock[pid], products[pid].min_stock) for pid in chunk},
+                        value=products_table.c.id
+                    ),
+                    "version": products_table.c.version + 1
+                }
+                chunk_restocked = {pid: now for pid in chunk if pid in restocked}
+                if chunk_restocked:
+                    values["last_restocked_at"] = case(
+                        chunk_restocked, value=products_table.c.id,
+                        else_=products_table.c.last_restocked_at
+                    )
                 
-                db.add(movement)
-                items_added += 1
+                result = db.execute(
+                    update(products_table)
+                    .where(
+                        products_table.c.id.in_(chunk),
+                        products_table.c.version == case(
+                            {pid: products[pid].version for pid in chunk}, value=products_table.c.id
+                        )
+                    )
+                    .values(**values)
+                )
+                if result.rowcount != len(chunk):
+                    raise StaleDataError("Stock changed concurrently during bulk adjustment")
+            
+            db.execute(insert(StockMovement), movements)
+            record_daily_sales(db, [movement for movement in movements if movement["movement_type"] == "sale"])
+            
+            for product_id in product_ids:
+                product = products[product_id]
+                changed[product_id] = (product.name, product.unit, stock[product_id], product.min_stock, product.price)
+            
+            return [
+                {
+                    "product_id": product_id,
+                    "product": products[product_id].name,
+                    "previous_stock": before[product_id],
+                    "new_stock": stock[product_id]
+                }
+                for product_id in product_ids
+            ]
         
-        invoice.is_processed = True
-        invoice.processed_at = datetime.utcnow()
-        db.commit()
+        updated = self._with_stock_retries(db, apply) if resolved else []
+        self.record_stock_changes(changed)
         
         return {
-            "invoice_id": invoice.id,
-            "items_count": items_added,
-            "items": parsed_items
+            "applied": len(resolved),
+            "failed": len(errors),
+            "products": updated,
+            "errors": errors
         }
     
-    async def _parse_invoice_with_llm(self, text: str) -> List[Dict]:
+    def _ocr_invoice_text(self, image_path: str) -> str:
         """
-        Use LLM to parse invoice text into structured data
-        Falls back to simple regex if LLM not available
+        OCR an invoice image into plain text (runs in the OCR worker pool)
         """
-        try:
-            # Try OpenAI first
-            import openai
-            openai.api_key = os.getenv("OPENAI_API_KEY")
-            
-            if openai.api_key:
-                response = openai.ChatCompletion.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are an invoice parser. Extract items, quantities, and units from the invoice text. Return JSON array with format: [{\"name\": \"item_name\", \"quantity\": 10, \"unit\": \"kg\"}]"
-                        },
-                        {
-                            "role": "user",
-                            "content": f"Parse this invoice:\n\n{text}"
-                        }
-                    ],
-                    temperature=0.1
+        ocr_result = self.ocr.reader.readtext(image_path)
+        return ' '.join([result[1] for result in ocr_result])
+    
+    def _match_invoice_items(self, parsed_items: List[Dict]):
+        """
+        Map each invoice line to a product through the name index
+        """
+        for item in parsed_items:
+            match = self.name_index.best_match(item['name'])
+            item['matched_product_id'] = match[0] if match else None
+            item['matched_product'] = match[1] if match else None
+            item['match_score'] = match[2] if match else 0
+    
+    async def _read_invoice(self, image_path: str) -> Dict:
+        """
+        OCR (off the event loop) and parse one invoice; nothing is written
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        
+        # Extract text using OCR
+        full_text = await loop.run_in_executor(self.ocr_pool, self._ocr_invoice_text, image_path)
+        ocr_done = time.perf_counter()
+        
+        # Parse with LLM (using OpenAI), regex fallback
+        parsed_items = await self._parse_invoice_with_llm(full_text)
+        parse_done = time.perf_counter()
+        
+        self._match_invoice_items(parsed_items)
+        
+        return {
+            "image_path": image_path,
+            "ocr_text": full_text,
+            "items": parsed_items,
+            "timings": {
+                "ocr_ms": round((ocr_done - started) * 1000, 1),
+                "parse_ms": round((parse_done - ocr_done) * 1000, 1)
+            }
+        }
+    
+    def _apply_invoice_restocks(self, db: Session, readings: List[Dict]):
+        """
+        Record invoices and apply all of their restocks in one transaction
+        Sets invoice_id and items_added on each reading
+        """
+        matched_ids = {
+            item['matched_product_id']
+            for reading in readings
+            for item in reading["items"]
+            if item['matched_product_id']
+        }
+        
+        changed = {}
+        
+        def restock():
+            changed.clear()
+            products = {
+                product.id: product
+                for product in db.query(Product).filter(Product.id.in_(matched_ids)).all()
+            } if matched_ids else {}
+            
+            now = datetime.utcnow()
+            invoices = []
+            for reading in readings:
+                invoice = Invoice(
+                    image_path=reading["image_path"],
+                    ocr_text=reading["ocr_text"],
+                    parsed_items=json.dumps(reading["items"]),
+                    invoice_date=now,
+                    is_processed=True,
+                    processed_at=now
                 )
+                db.add(invoice)
+                invoices.append(invoice)
+            db.flush()  # Invoice ids for the ledger references
+            
+            for invoice, reading in zip(invoices, readings):
+                items_added = 0
+                for item in reading["items"]:
+                    product = products.get(item['matched_product_id'])
+                    
+                    if product:
+                        # Update existing product stock
+                        previous_stock = product.current_stock
+                        new_stock = previous_stock + item['quantity']
+                        
+                        movement = StockMovement(
+                            product_id=product.id,
+                            movement_type="restock",
+                            quantity=item['quantity'],
+                            previous_stock=previous_stock,
+                            new_stock=new_stock,
+                            reference_type="invoice",
+                            reference_id=invoice.id,
+                            notes=f"Restocked from invoice {invoice.id}"
+                        )
+                        
+                        product.current_stock = new_stock
+                        product.stock_status = stock_status(new_stock, product.min_stock)
+                        product.last_restocked_at = now
+                        changed[product.id] = (product.name, product.unit, new_stock, product.min_stock, product.price)
+                        
+                        db.add(movement)
+                        items_added += 1
                 
-                result = response.choices[0].message.content
-                return json.loads(result)
-        
-        except Exception as e:
-            print(f"LLM parsing failed: {e}, falling back to regex")
+                reading["invoice_id"] = invoice.id
+                reading["items_added"] = items_added
         
-        # Fallback: Simple regex parsing
-        return self._parse_invoice_regex(text)
+        self._with_stock_retries(db, restock)
+        self.record_stock_changes(changed)
     
-    def _parse_invoice_regex(self, text: str) -> List[Dict]:
+    async def process_invoice_image(self, image_path: str, db: Session) -> Dict:
         """
-        Fallback invoice parser using regex
+        Process supplier invoice using OCR + LLM
+        Extracts items and quantities to update inventory; invoice lines
+        are mapped to products through the in-memory name index
         """
-        import re
+        reading = await self._read_invoice(image_path)
+        self._apply_invoice_restocks(db, [reading])
         
-        items = []
+        return {
+            "invoice_id": reading["invoice_id"],
+            "items_count": reading["items_added"],
+            "items": reading["items"]
+        }
+    
+    async def process_invoice_batch(self, image_paths: List[str], db: Session) -> Dict:
+        """
+        Process a stack of supplier invoices
         
-        # Pattern: quantity + unit + name
-        # Example: "50 kg Gula Pasir" or "100 pcs Kopi Bubuk"
-        pattern = r'(\d+(?:[.,]\d+)?)\s*(kg|gram|liter|pcs|box|karton|pack)\s+([A-Za-z\s]+)'
+        Invoices are OCR'd in parallel on the worker pool and parsed
+        concurrently; every successfully read invoice and its restocks are
+        then written in a single transaction. A failed read is reported
+        for that invoice only.
+        """
+        started = time.perf_counter()
+        readings = await asyncio.gather(
+            *(self._read_invoice(image_path) for image_path in image_paths),
+            return_exceptions=True
+        )
+        read_done = time.perf_counter()
         
-        matches = re.findall(pattern, text, re.IGNORECASE)
+        succeeded = [reading for reading in readings if not isinstance(reading, Exception)]
+        if succeeded:
+            self._apply_invoice_restocks(db, succeeded)
+        apply_done = time.perf_counter()
         
-        for match in matches:
-            quantity_str, unit, name = match
-            quantity = float(quantity_str.replace(',', '.'))
-            
-            items.append({
-                "name": name.strip(),
-                "quantity": quantity,
-                "unit": unit.lower()
-            })
+        results = []
+        for image_path, reading in zip(image_paths, readings):
+            if isinstance(reading, Exception):
+                results.append({
+                    "image_path": image_path,
+                    "status": "error",
+                    "error": str(reading)
+                })
+            else:
+                results.append({
+                    "image_path": image_path,
+                    "status": "success",
+                    "invoice_id": reading["invoice_id"],
+                    "items_added": reading["items_added"],
+                    "items": reading["items"],
+                    "timings": reading["timings"]
+                })
         
+        return {
+            "processed": len(succeeded),
+            "failed": len(image_paths) - len(succeeded),
+            "items_added": sum(reading["items_added"] for reading in succeeded),
+            "invoices": results,
+            "timings": {
+                "read_ms": round((read_done - started) * 1000, 1),
+                "apply_ms": round((apply_done - read_done) * 1000, 1),
+                "total_ms": round((apply_done - started) * 1000, 1)
+            }
+        }
+    
+    async def _parse_invoice_with_llm(self, text: str) -> List[Dict]:
+        """
+        Use LLM to parse invoice text into structured data
+        Falls back to simple regex if LLM not available or too slow
+        """
+        items, _ = await self.invoice_parser.parse(text)
         return items
     
+    def _parse_invoice_regex(self, text: str) -> List[Dict]:
+        """
+        Fallback invoice parser using regex
+        """
+        return parse_invoice_regex(text)
+    
     def deduct_stock_from_payment(
         self,
         db: Session,
         payment_id: int,
-        items: List[Dict]
+        items: Optional[List[Dict]] = None
     ) -> Dict:
         """
         Deduct inventory when payment is verified
         
-        items: List of {"product_id": int, "quantity": float}
+        items: List of {"product_id": int, "quantity": float}; defaults to
+        the payment's active reservations (read from stock_reservations,
+        so holds made by any process count; nothing is deducted and
+        status is "skipped" if there are none). Active reservations are
+        converted: their hold is released in the same UPDATE that deducts
+        the sale.
+        
+        Set-based: products are loaded with one IN query, stock is
+        swapped with a single versioned UPDATE and ledger rows are
+        bulk-inserted, so cart size does not change the round trips.
         """
         payment = db.query(Payment).filter(Payment.id == payment_id).first()
         
         if not payment or not payment.is_verified:
             return {"status": "error", "message": "Payment not verified"}
         
-        deducted_items = []
+        if items is None:
+            items = [
+                {"product_id": product_id, "quantity": quantity}
+                for product_id, quantity in self._reserved_quantities(db, [payment_id]).get(payment_id, {}).items()
+            ]
+            if not items:
+                self.reservations.discard(payment_id)
+                return {"status": "skipped", "message": "No active reservations", "items_deducted": [], "count": 0}
         
-        for item in items:
-            product = db.query(Product).filter(Product.id == item['product_id']).first()
+        product_ids = {item['product_id'] for item in items}
+        changed = {}
+        
+        def deduct():
+            changed.clear()
+            reserved = self._reserved_quantities(db, [payment_id]).get(payment_id, {})
+            if not product_ids and not reserved:
+                return []
             
-            if not product:
-                continue
+            # Load every product in the cart (and any reserved) with a single IN query
+            products = {
+                product.id: product
+                for product in db.query(Product).filter(
+                    Product.id.in_(product_ids | reserved.keys())
+                ).all()
+            }
+            reserved = {product_id: quantity for product_id, quantity in reserved.items() if product_id in products}
             
-            previous_stock = product.current_stock
-            new_stock = previous_stock - item['quantity']
+            sold_items = [item for item in items if item['product_id'] in products]
+            if not sold_items and not reserved:
+                return []
             
-            # Create stock movement
-            movement = StockMovement(
-                product_id=product.id,
-                movement_type="sale",
-                quantity=-item['quantity'],  # Negative for sale
-                previous_stock=previous_stock,
-                new_stock=new_stock,
-                reference_type="payment",
-                reference_id=payment_id,
-                notes=f"Sold via payment {payment_id}"
-            )
+            # Total quantity per product (a cart may list the same product twice)
+            totals = {}
+            for item in sold_items:
+                totals[item['product_id']] = totals.get(item['product_id'], 0) + item['quantity']
             
-            # Update product
-            product.current_stock = new_stock
-            product.total_sold += item['quantity']
+            stock_after = {
+                product_id: products[product_id].current_stock - total
+                for product_id, total in totals.items()
+            }
+            status_after = {
+                product_id: stock_status(stock, products[product_id].min_stock)
+                for product_id, stock in stock_after.items()
+            }
+            touched = totals.keys() | reserved.keys()
+            versions = {product_id: products[product_id].version for product_id in touched}
             
-            # Create payment item record
-            payment_item = PaymentItem(
-                payment_id=payment_id,
-                product_id=product.id,
-                quantity=item['quantity'],
-                unit_price=product.price,
-                subtotal=product.price * item['quantity']
+            # One compare-and-swap UPDATE for the whole cart; every row must
+            # still carry the version we read, otherwise someone else won
+            products_table = Product.__table__
+            values = {"version": products_table.c.version + 1}
+            if totals:
+                values.update(
+                    current_stock=case(stock_after, value=products_table.c.id, else_=products_table.c.current_stock),
+                    stock_status=case(status_after, value=products_table.c.id, else_=products_table.c.stock_status),
+                    total_sold=func.coalesce(products_table.c.total_sold, 0)
+                    + case(totals, value=products_table.c.id, else_=0)
+                )
+            if reserved:
+                values["reserved_stock"] = func.coalesce(products_table.c.reserved_stock, 0) \
+                    - case(reserved, value=products_table.c.id, else_=0)
+            
+            result = db.execute(
+                update(products_table)
+                .where(
+                    products_table.c.id.in_(touched),
+                    products_table.c.version == case(versions, value=products_table.c.id)
+                )
+                .values(**values)
             )
+            if result.rowcount != len(touched):
+                raise StaleDataError(
+                    f"Stock changed concurrently for payment {payment_id}"
+                )
             
-            db.add(movement)
-            db.add(payment_item)
-            deducted_items.append(product.name)
+            now = datetime.utcnow()
+            if reserved:
+                self._resolve_reservations(db, [payment_id], CONVERTED, now)
+            
+            for product_id, stock in stock_after.items():
+                product = products[product_id]
+                changed[product_id] = (product.name, product.unit, stock, product.min_stock, product.price)
+            
+            # Per-item ledger, starting from the stock we swapped against
+            running_stock = {product_id: products[product_id].current_stock for product_id in totals}
+            movements = []
+            payment_items = []
+            deducted_items = []
+            
+            for item in sold_items:
+                product = products[item['product_id']]
+                previous_stock = running_stock[product.id]
+                new_stock = previous_stock - item['quantity']
+                running_stock[product.id] = new_stock
+                
+                movements.append({
+                    "product_id": product.id,
+                    "movement_type": "sale",
+                    "quantity": -item['quantity'],  # Negative for sale
+                    "previous_stock": previous_stock,
+                    "new_stock": new_stock,
+                    "reference_type": "payment",
+                    "reference_id": payment_id,
+                    "notes": f"Sold via payment {payment_id}",
+                    "created_at": now
+                })
+                payment_items.append({
+                    "payment_id": payment_id,
+                    "product_id": product.id,
+                    "quantity": item['quantity'],
+                    "unit_price": product.price,
+                    "subtotal": product.price * item['quantity']
+                })
+                deducted_items.append(product.name)
+            
+            # Bulk insert ledger and line items
+            if movements:
+                db.execute(insert(StockMovement), movements)
+                db.execute(insert(PaymentItem), payment_items)
+                record_daily_sales(db, movements)
+            return deducted_items
         
-        db.commit()
+        deducted_items = self._with_stock_retries(db, deduct)
+        self.record_stock_changes(changed)
+        self.reservations.discard(payment_id)
         
         return {
             "status": "success",
@@ -211,6 +720,223 @@ class InventoryManager:
             "count": len(deducted_items)
         }
     
+    def _reserved_quantities(self, db: Session, payment_ids: List[int]) -> Dict[int, Dict[int, float]]:
+        """Active reserved quantity per product, per payment"""
+        reserved = {}
+        for payment_id, product_id, quantity in db.query(
+            StockReservation.payment_id, StockReservation.product_id, StockReservation.quantity
+        ).filter(
+            StockReservation.payment_id.in_(payment_ids),
+            StockReservation.status == ACTIVE
+        ):
+            per_product = reserved.setdefault(payment_id, {})
+            per_product[product_id] = per_product.get(product_id, 0) + quantity
+        return reserved
+    
+    def _resolve_reservations(self, db: Session, payment_ids: List[int], status: str, now: datetime):
+        db.execute(
+            update(StockReservation.__table__)
+            .where(
+                StockReservation.__table__.c.payment_id.in_(payment_ids),
+                StockReservation.__table__.c.status == ACTIVE
+            )
+            .values(status=status, resolved_at=now)
+        )
+    
+    def reserve_stock(
+        self,
+        db: Session,
+        payment_id: int,
+        items: List[Dict],
+        ttl_seconds: Optional[int] = None
+    ) -> Dict:
+        """
+        Hold stock for a payment that is waiting for verification
+        
+        items: List of {"product_id": int, "quantity": float}
+        
+        Fails without holding anything if any product lacks available
+        stock (current_stock - reserved_stock). The hold expires after
+        ttl_seconds unless the payment is verified and deducted first.
+        """
+        payment = db.query(Payment).filter(Payment.id == payment_id).first()
+        if not payment:
+            return {"status": "error", "message": "Payment not found"}
+        if payment.is_verified:
+            return {"status": "error", "message": "Payment already verified"}
+        
+        totals = {}
+        for item in items:
+            if item['quantity'] <= 0:
+                return {"status": "error", "message": "Quantities must be positive"}
+            totals[item['product_id']] = totals.get(item['product_id'], 0) + item['quantity']
+        if not totals:
+            return {"status": "error", "message": "No items to reserve"}
+        
+        ttl_seconds = ttl_seconds or self.reservation_ttl_seconds
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl_seconds)
+        
+        def reserve():
+            if db.query(StockReservation.id).filter(
+                StockReservation.payment_id == payment_id,
+                StockReservation.status == ACTIVE
+            ).first():
+                return {"status": "error", "message": "Payment already has an active reservation"}
+            
+            products = {
+                product.id: product
+                for product in db.query(Product).filter(Product.id.in_(totals.keys())).all()
+            }
+            missing = [product_id for product_id in totals if product_id not in products]
+            if missing:
+                return {"status": "error", "message": f"Products not found: {missing}"}
+            
+            available = {
+                product_id: (products[product_id].current_stock or 0) - (products[product_id].reserved_stock or 0)
+                for product_id in totals
+            }
+            short = [
+                {
+                    "product_id": product_id,
+                    "product": products[product_id].name,
+                    "requested": quantity,
+                    "available": available[product_id]
+                }
+                for product_id, quantity in totals.items()
+                if available[product_id] < quantity
+            ]
+            if short:
+                return {"status": "error", "message": "Insufficient stock", "products": short}
+            
+            products_table = Product.__table__
+            versions = {product_id: products[product_id].version for product_id in totals}
+            result = db.execute(
+                update(products_table)
+                .where(
+                    products_table.c.id.in_(totals.keys()),
+                    products_table.c.version == case(versions, value=products_table.c.id)
+                )
+                .values(
+                    reserved_stock=func.coalesce(products_table.c.reserved_stock, 0)
+                    + case(totals, value=products_table.c.id),
+                    version=products_table.c.version + 1
+                )
+            )
+            if result.rowcount != len(totals):
+                raise StaleDataError(f"Stock changed concurrently for payment {payment_id}")
+            
+            now = datetime.utcnow()
+            db.execute(insert(StockReservation), [
+                {
+                    "payment_id": payment_id,
+                    "product_id": product_id,
+                    "quantity": quantity,
+                    "status": ACTIVE,
+                    "expires_at": expires_at,
+                    "created_at": now
+                }
+                for product_id, quantity in totals.items()
+            ])
+            
+            return {
+                "status": "success",
+                "payment_id": payment_id,
+                "expires_at": expires_at.isoformat(),
+                "items": [
+                    {"product_id": product_id, "product": products[product_id].name, "quantity": quantity}
+                    for product_id, quantity in totals.items()
+                ]
+            }
+        
+        result = self._with_stock_retries(db, reserve)
+        if result["status"] == "success":
+            self.reservations.add(payment_id, expires_at)
+        return result
+    
+    def release_reservations(self, db: Session, payment_ids: List[int], status: str = RELEASED) -> int:
+        """
+        Give reserved stock back (cancelled or expired payments)
+        Returns the number of payments released
+        """
+        if not payment_ids:
+            return 0
+        
+        def release():
+            reserved = self._reserved_quantities(db, payment_ids)
+            if not reserved:
+                return 0
+            
+            totals = {}
+            for per_product in reserved.values():
+                for product_id, quantity in per_product.items():
+                    totals[product_id] = totals.get(product_id, 0) + quantity
+            
+            versions = dict(db.query(Product.id, Product.version).filter(Product.id.in_(totals.keys())).all())
+            totals = {product_id: quantity for product_id, quantity in totals.items() if product_id in versions}
+            
+            if totals:
+                products_table = Product.__table__
+                result = db.execute(
+                    update(products_table)
+                    .where(
+                        products_table.c.id.in_(totals.keys()),
+                        products_table.c.version == case(versions, value=products_table.c.id)
+                    )
+                    .values(
+                        reserved_stock=func.coalesce(products_table.c.reserved_stock, 0)
+                        - case(totals, value=products_table.c.id),
+                        version=products_table.c.version + 1
+                    )
+                )
+                if result.rowcount != len(totals):
+                    raise StaleDataError("Stock changed concurrently while releasing reservations")
+            
+            self._resolve_reservations(db, list(reserved.keys()), status, datetime.utcnow())
+            return len(reserved)
+        
+        released = self._with_stock_retries(db, release)
+        for payment_id in payment_ids:
+            self.reservations.discard(payment_id)
+        return released
+    
+    def convert_verified_payment(self, db: Session, payment_id: int) -> Optional[Dict]:
+        """
+        Turn a newly verified payment's reservations into the sale; called
+        wherever a payment becomes verified. None if it held nothing.
+        
+        If the deduction keeps conflicting, the reservations stay active
+        and the payment is due again at once, so the next expiry sweep
+        retries the conversion instead of the sale being lost.
+        """
+        try:
+            result = self.deduct_stock_from_payment(db, payment_id)
+        except StockConflictError as e:
+            self.reservations.add(payment_id, datetime.utcnow())
+            print(f"⚠️ Stock conversion for payment {payment_id} deferred: {e}")
+            return {"status": "pending", "message": f"{e}; retrying shortly"}
+        return None if result["status"] == "skipped" else result
+    
+    def release_expired_reservations(self, db: Session) -> int:
+        """
+        Release every reservation whose TTL has passed (driven by the expiry
+        heap); payments verified in the meantime are converted instead
+        Returns the number of payments released
+        """
+        due = self.reservations.pop_due()
+        if not due:
+            return 0
+        
+        verified = {
+            payment_id for (payment_id,) in db.query(Payment.id).filter(
+                Payment.id.in_(due), Payment.is_verified == True
+            )
+        }
+        for payment_id in verified:
+            self.convert_verified_payment(db, payment_id)
+        return self.release_reservations(
+            db, [payment_id for payment_id in due if payment_id not in verified], status=EXPIRED
+        )
+    
     async def forecast_stock_needs(
         self,
         product_id: int,
@@ -219,35 +945,34 @@ class InventoryManager:
     ) -> Dict:
         """
         Forecast stock needs for next N days using time-series analysis
+        (exponential smoothing, see DemandForecaster)
         """
         product = db.query(Product).filter(Product.id == product_id).first()
         
         if not product:
             return {"error": "Product not found"}
         
-        # Get sales history (last 30 days)
-        cutoff_date = datetime.utcnow() - timedelta(days=30)
-        
-        movements = db.query(StockMovement).filter(
-            StockMovement.product_id == product_id,
-            StockMovement.movement_type == "sale",
-            StockMovement.created_at >= cutoff_date
-        ).all()
+        # Need some recent sales history from the daily rollup, over the same
+        # closed days the flat forecast averages (today's sales aren't in it yet)
+        start, end = flat_window(datetime.utcnow().date())
+        transactions = db.query(func.sum(DailyProductSales.transactions)).filter(
+            DailyProductSales.product_id == product_id,
+            DailyProductSales.sale_date >= start,
+            DailyProductSales.sale_date <= end
+        ).scalar()
         
-        if len(movements) < 3:
+        if (transactions or 0) < 3:
             return {
                 "product": product.name,
                 "message": "Not enough data for forecast",
                 "recommendation": "Need at least 3 sales transactions"
             }
         
-        # Calculate average daily sales
-        total_sold = sum(abs(m.quantity) for m in movements)
-        days_tracked = (datetime.utcnow() - movements[-1].created_at).days or 1
-        avg_daily_sales = total_sold / days_tracked
+        # Forecast from the cached smoothing state
+        daily_forecast = self.forecaster.forecast(db, days, [product_id])[product_id]
+        predicted_sales = float(daily_forecast.sum())
+        avg_daily_sales = predicted_sales / days if days > 0 else 0
         
-        # Forecast
-        predicted_sales = avg_daily_sales * days
         current_stock = product.current_stock
         stock_after_forecast = current_stock - predicted_sales
         
@@ -264,6 +989,7 @@ class InventoryManager:
             "current_stock": current_stock,
             "unit": product.unit,
             "forecast_period_days": days,
+            "forecast_method": self.forecaster.method,
             "avg_daily_sales": round(avg_daily_sales, 2),
             "predicted_sales_next_n_days": round(predicted_sales, 2),
             "stock_after_n_days": round(stock_after_forecast, 2),
@@ -273,28 +999,158 @@ class InventoryManager:
             "warning": f"⚠️ Order {round(needed_quantity, 2)} {product.unit} now!" if needs_restock else "✅ Stock sufficient"
         }
     
-    def get_inventory_summary(self, db: Session) -> Dict:
+    async def forecast_all_stock_needs(self, days: int, db: Session) -> Dict:
         """
-        Get overall inventory summary
+        Forecast stock needs for every product in one pass
+        
+        Demand comes from the cached smoothing state (DemandForecaster) and
+        the stock outlook is computed column-wise with pandas; results are
+        sorted by urgency (restock needed first, then soonest stock-out).
         """
-        total_products = db.query(Product).count()
+        now = datetime.utcnow()
+        today = pd.Timestamp(now.date())
+        window_start, window_end = flat_window(now.date())
         
-        low_stock_count = db.query(Product).filter(
-            Product.current_stock <= Product.min_stock
-        ).count()
+        products = pd.DataFrame(
+            db.query(
+                Product.id, Product.name, Product.unit,
+                Product.current_stock, Product.min_stock
+            ).all(),
+            columns=["product_id", "product", "unit", "current_stock", "min_stock"]
+        )
+        if products.empty:
+            return {
+                "forecast_period_days": days,
+                "generated_at": now.isoformat(),
+                "total_products": 0,
+                "needs_restock_count": 0,
+                "products": []
+            }
+        
+        transactions = pd.DataFrame(
+            db.query(
+                DailyProductSales.product_id,
+                func.sum(DailyProductSales.transactions)
+            ).filter(
+                DailyProductSales.sale_date >= window_start,
+                DailyProductSales.sale_date <= window_end
+            ).group_by(DailyProductSales.product_id).all(),
+            columns=["product_id", "transactions"]
+        ).set_index("product_id")
+        
+        df = products.join(transactions, on="product_id")
+        df["current_stock"] = df["current_stock"].fillna(0).astype(float)
+        df["min_stock"] = df["min_stock"].fillna(0).astype(float)
+        df["transactions"] = df["transactions"].fillna(0).astype(int)
+        
+        # One vectorized forecast for every product from the cached smoothing state
+        daily_forecast = self.forecaster.forecast(db, days, df["product_id"].tolist())
+        predicted_sales = np.array([
+            daily_forecast[product_id].sum() for product_id in df["product_id"]
+        ], dtype=float)
+        avg_daily_sales = predicted_sales / days if days > 0 else np.zeros(len(df))
+        
+        stock_after_forecast = df["current_stock"].to_numpy() - predicted_sales
+        has_data = (df["transactions"] >= 3).to_numpy()
+        needs_restock = has_data & (stock_after_forecast < df["min_stock"].to_numpy())
+        
+        # Add 3 days buffer on top of the shortfall
+        needed_quantity = np.where(
+            needs_restock,
+            df["min_stock"].to_numpy() - stock_after_forecast + avg_daily_sales * 3,
+            0.0
+        )
         
-        out_of_stock_count = db.query(Product).filter(
-            Product.current_stock <= 0
-        ).count()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            days_until_stockout = np.where(
+                avg_daily_sales > 0,
+                np.maximum(df["current_stock"].to_numpy(), 0) / avg_daily_sales,
+                np.inf
+            )
+        
+        df["avg_daily_sales"] = avg_daily_sales.round(2)
+        df["predicted_sales_next_n_days"] = predicted_sales.round(2)
+        df["stock_after_n_days"] = stock_after_forecast.round(2)
+        df["needs_restock"] = needs_restock
+        df["recommended_order_quantity"] = needed_quantity.round(2)
+        df["days_until_stockout"] = days_until_stockout
+        df["has_enough_data"] = has_data
+        
+        # Urgency: restock needed first, then soonest stock-out; no-data products last
+        df = df.sort_values(
+            ["has_enough_data", "needs_restock", "days_until_stockout"],
+            ascending=[False, False, True],
+            kind="stable"
+        )
         
-        total_value = db.query(
-            func.sum(Product.current_stock * Product.price)
-        ).scalar() or 0
+        stockout_dates = today + pd.to_timedelta(
+            df["days_until_stockout"].where(np.isfinite(df["days_until_stockout"])),
+            unit="D"
+        )
+        
+        results = []
+        for row, stockout_date in zip(df.itertuples(index=False), stockout_dates):
+            entry = {
+                "product_id": int(row.product_id),
+                "product": row.product,
+                "current_stock": float(row.current_stock),
+                "unit": row.unit,
+                "min_stock_threshold": float(row.min_stock)
+            }
+            if not row.has_enough_data:
+                entry["message"] = "Not enough data for forecast"
+                results.append(entry)
+                continue
+            
+            finite = np.isfinite(row.days_until_stockout)
+            entry.update({
+                "avg_daily_sales": float(row.avg_daily_sales),
+                "predicted_sales_next_n_days": float(row.predicted_sales_next_n_days),
+                "stock_after_n_days": float(row.stock_after_n_days),
+                "days_until_stockout": round(float(row.days_until_stockout), 1) if finite else None,
+                "stockout_date": stockout_date.date().isoformat() if finite else None,
+                "needs_restock": bool(row.needs_restock),
+                "recommended_order_quantity": float(row.recommended_order_quantity),
+                "warning": f"⚠️ Order {row.recommended_order_quantity} {row.unit} now!" if row.needs_restock else "✅ Stock sufficient"
+            })
+            results.append(entry)
         
         return {
-            "total_products": total_products,
+            "forecast_period_days": days,
+            "forecast_method": self.forecaster.method,
+            "generated_at": now.isoformat(),
+            "total_products": len(results),
+            "needs_restock_count": int(needs_restock.sum()),
+            "products": results
+        }
+    
+    def get_inventory_summary(self, db: Session) -> Dict:
+        """
+        Get overall inventory summary
+        Served from the running totals and the low-stock alert set
+        """
+        totals = self.inventory_totals.totals(db)
+        alert_counts = self.stock_alerts.counts(db)
+        low_stock_count = alert_counts["low_stock"]
+        
+        return {
+            "total_products": totals["total_products"],
             "low_stock_alerts": low_stock_count,
-            "out_of_stock": out_of_stock_count,
-            "total_inventory_value": round(total_value, 2),
+            "out_of_stock": alert_counts["out_of_stock"],
+            "total_inventory_value": round(totals["total_inventory_value"], 2),
             "status": "⚠️ Attention needed" if low_stock_count > 0 else "✅ All good"
         }
+    
+    def reconcile_inventory(self, db: Session) -> Dict:
+        """
+        Check the cached summary against the products table
+        Re-flags stock status and reloads the caches on drift
+        """
+        cached_counts = self.stock_alerts.counts()
+        reflagged = self.stock_alerts.sync(db)
+        report = self.inventory_totals.reconcile(db)
+        
+        report["reflagged"] = reflagged
+        report["alert_drift"] = cached_counts != self.stock_alerts.counts()
+        report["consistent"] = report["consistent"] and not reflagged and not report["alert_drift"]
+        return report
@@ -0,0 +1,109 @@
+"""
+Running inventory totals - product count and stock value kept in memory
+
+Each product's stock value (current_stock * price) is held per product
+and the total is adjusted by the difference whenever a stock write
+commits, so the inventory summary is answered without touching the
+products table. Together with the low-stock alert set this makes
+get_inventory_summary constant time.
+
+Writes that bypass InventoryManager (scripts, manual SQL) are caught by
+reconcile(), which recomputes the aggregates and reloads on drift; it
+runs periodically from the API process.
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from backend.models.database import Product
+
+
+class InventoryTotals:
+    """
+    Write-through cache of product count and total inventory value
+    """
+
+    def __init__(self):
+        self._values: Dict[int, float] = {}
+        self._total_value = 0.0
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.last_reconciled_at: Optional[datetime] = None
+
+    def load(self, db: Session):
+        """Rebuild the per-product values from the products table"""
+        rows = db.query(Product.id, Product.current_stock, Product.price).all()
+        values = {product_id: (stock or 0) * (price or 0) for product_id, stock, price in rows}
+
+        with self._lock:
+            self._values = values
+            self._total_value = sum(values.values())
+            self.loaded = True
+
+    def invalidate(self):
+        """Drop the cache; the next read reloads it"""
+        with self._lock:
+            self._values = {}
+            self._total_value = 0.0
+            self.loaded = False
+
+    def track(self, product_id: int, current_stock: float, price: float):
+        """Record a product's new stock level (or a new product)"""
+        value = (current_stock or 0) * (price or 0)
+        with self._lock:
+            if not self.loaded:
+                return  # Picked up by the next load
+            self._total_value += value - self._values.get(product_id, 0.0)
+            self._values[product_id] = value
+
+    def remove(self, product_id: int):
+        """Forget a deleted product"""
+        with self._lock:
+            self._total_value -= self._values.pop(product_id, 0.0)
+
+    def totals(self, db: Optional[Session] = None) -> Dict:
+        """{"total_products", "total_inventory_value"}"""
+        if not self.loaded and db is not None:
+            self.load(db)
+        with self._lock:
+            return {
+                "total_products": len(self._values),
+                "total_inventory_value": self._total_value
+            }
+
+    def reconcile(self, db: Session, tolerance: float = 0.01) -> Dict:
+        """
+        Compare the running totals with a fresh aggregate over products
+        Reloads (and reports drift) if they disagree
+        """
+        total_products = db.query(func.count(Product.id)).scalar() or 0
+        total_value = db.query(
+            func.sum(Product.current_stock * Product.price)
+        ).scalar() or 0
+
+        cached = self.totals()
+        drift = {
+            "products": cached["total_products"] - total_products,
+            "value": round(cached["total_inventory_value"] - total_value, 2)
+        }
+        consistent = self.loaded and drift["products"] == 0 and abs(drift["value"]) <= tolerance
+
+        if not consistent:
+            self.load(db)
+        self.last_reconciled_at = datetime.utcnow()
+
+        return {
+            "consistent": consistent,
+            "drift": drift,
+            "total_products": total_products,
+            "total_inventory_value": total_value,
+            "checked_at": self.last_reconciled_at.isoformat()
+        }
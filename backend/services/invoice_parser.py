@@ -0,0 +1,190 @@
+"""
+Invoice text parser - async LLM with deadline, concurrency limit and cache
+
+The LLM call goes through the async OpenAI client so it never blocks the
+event loop. Calls share a semaphore (LLM_MAX_CONCURRENCY) and each parse
+has a total time budget (LLM_TIMEOUT_SECONDS) covering both the wait for a
+slot and the request; when the budget runs out the regex parser answers
+instead. Successful LLM results are cached by a hash of the OCR text, and
+identical texts parsed concurrently share a single request.
+
+Point OPENAI_BASE_URL at backend/scripts/stub_llm_server.py to run
+without the real API.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from openai import AsyncOpenAI
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+SYSTEM_PROMPT = (
+    "You are an invoice parser. Extract items, quantities, and units from the invoice text. "
+    "Return JSON array with format: [{\"name\": \"item_name\", \"quantity\": 10, \"unit\": \"kg\"}]"
+)
+
+# Pattern: quantity + unit + name
+# Example: "50 kg Gula Pasir" or "100 pcs Kopi Bubuk"
+INVOICE_LINE_PATTERN = re.compile(
+    r'(\d+(?:[.,]\d+)?)\s*(kg|gram|liter|pcs|box|karton|pack)\s+([A-Za-z\s]+)',
+    re.IGNORECASE
+)
+
+
+def parse_invoice_regex(text: str) -> List[Dict]:
+    """
+    Fallback invoice parser using regex
+    """
+    items = []
+
+    for quantity_str, unit, name in INVOICE_LINE_PATTERN.findall(text):
+        quantity = float(quantity_str.replace(',', '.'))
+
+        items.append({
+            "name": name.strip(),
+            "quantity": quantity,
+            "unit": unit.lower()
+        })
+
+    return items
+
+
+def _load_llm_items(content: str) -> List[Dict]:
+    """Parse the model's JSON answer, tolerating ```json fences"""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("`")
+        if content.lower().startswith("json"):
+            content = content[4:]
+
+    items = json.loads(content)
+    if isinstance(items, dict):
+        items = items.get("items", [])
+
+    return [
+        {
+            "name": str(item["name"]).strip(),
+            "quantity": float(item["quantity"]),
+            "unit": str(item.get("unit") or "").lower()
+        }
+        for item in items
+        if isinstance(item, dict) and item.get("name") and item.get("quantity") is not None
+    ]
+
+
+class InvoiceParser:
+    """
+    Non-blocking, cached LLM invoice parser with regex fallback
+    """
+
+    def __init__(self):
+        self.model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+        self.timeout = float(os.getenv("LLM_TIMEOUT_SECONDS", "15"))
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+        self.cache_size = int(os.getenv("LLM_CACHE_SIZE", "512"))
+
+        self._client = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._cache: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"cache_hits": 0, "shared_requests": 0, "llm_calls": 0, "timeouts": 0, "fallbacks": 0}
+
+        # Build the client (and its TLS context) up front, not inside a request
+        self._get_client()
+
+    def _get_client(self):
+        """Lazily create the async OpenAI client (None if no API key)"""
+        if self._client is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not OPENAI_AVAILABLE or not api_key or api_key == "your_openai_api_key":
+                return None
+
+            self._client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=os.getenv("OPENAI_BASE_URL") or None,
+                timeout=self.timeout,
+                max_retries=0  # The deadline below is the retry budget
+            )
+        return self._client
+
+    @staticmethod
+    def cache_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[List[Dict]]:
+        items = self._cache.get(key)
+        if items is not None:
+            self._cache.move_to_end(key)
+        return items
+
+    def _cache_put(self, key: str, items: List[Dict]):
+        self._cache[key] = items
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _ask_llm(self, client, key: str, text: str) -> List[Dict]:
+        async with self._semaphore:
+            self.stats["llm_calls"] += 1
+            response = await client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Parse this invoice:\n\n{text}"}
+                ],
+                temperature=0.1
+            )
+        items = _load_llm_items(response.choices[0].message.content)
+        self._cache_put(key, items)
+        return items
+
+    def _llm_request(self, client, key: str, text: str) -> asyncio.Future:
+        """One request per distinct text, shared by every caller waiting on it"""
+        request = self._inflight.get(key)
+        if request is not None:
+            self.stats["shared_requests"] += 1
+            return request
+
+        request = asyncio.ensure_future(self._ask_llm(client, key, text))
+        self._inflight[key] = request
+        request.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return request
+
+    async def parse(self, text: str, timeout: Optional[float] = None) -> Tuple[List[Dict], str]:
+        """
+        Parse invoice text into [{"name", "quantity", "unit"}]
+        Returns (items, source) where source is "cache", "llm" or "regex"
+        """
+        key = self.cache_key(text)
+        cached = self._cache_get(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return [dict(item) for item in cached], "cache"
+
+        client = self._get_client()
+        if client is not None:
+            try:
+                # shield: a caller giving up must not cancel the shared request;
+                # if it finishes late its result still lands in the cache
+                items = await asyncio.wait_for(
+                    asyncio.shield(self._llm_request(client, key, text)),
+                    timeout=self.timeout if timeout is None else timeout
+                )
+                return [dict(item) for item in items], "llm"
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                print("LLM parsing timed out, falling back to regex")
+            except Exception as e:
+                print(f"LLM parsing failed: {e}, falling back to regex")
+
+        # Fallback: Simple regex parsing (not cached, the LLM may answer next time)
+        self.stats["fallbacks"] += 1
+        return parse_invoice_regex(text), "regex"
@@ -0,0 +1,177 @@
+"""
+Local OCR - offline text extraction with EasyOCR or Tesseract
+
+Gives AdvancedOCR a backend that needs no network or credentials and
+returns the same (text, (center_y, center_x), confidence) words as the
+cloud backends. The EasyOCR model is loaded once per process and shared
+(BookReportOCR and PaymentOCR use the same reader); pages are read on a
+small worker pool (LOCAL_OCR_WORKERS) so a long page never ties up more
+than its own worker, and a caller can stop waiting at its deadline.
+
+LOCAL_OCR_ENGINE picks the engine: easyocr, tesseract, or auto (EasyOCR
+if installed, else Tesseract). Languages come from OCR_LANGUAGES and GPU
+use from OCR_GPU.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from backend.services.image_preprocessing import normalize_gray
+
+try:
+    import easyocr
+    EASYOCR_AVAILABLE = True
+except ImportError:
+    EASYOCR_AVAILABLE = False
+
+try:
+    import pytesseract
+    TESSERACT_AVAILABLE = True
+except ImportError:
+    TESSERACT_AVAILABLE = False
+
+TextPosition = Tuple[str, Tuple[int, int], float]
+
+# EasyOCR language codes -> Tesseract traineddata names
+TESSERACT_LANGUAGES = {"id": "ind", "en": "eng"}
+
+_reader = None
+_reader_lock = threading.Lock()
+_tesseract = None
+
+
+def ocr_languages() -> List[str]:
+    """OCR_LANGUAGES as a list: JSON (["id", "en"]) or comma-separated"""
+    raw = os.getenv('OCR_LANGUAGES', '').strip()
+    if raw.startswith('['):
+        try:
+            return [str(lang) for lang in json.loads(raw)]
+        except ValueError:
+            pass
+    languages = [lang.strip().strip('"\'') for lang in raw.strip('[]').split(',') if lang.strip()]
+    return languages or ['id', 'en']
+
+
+def get_easyocr_reader():
+    """The process-wide EasyOCR reader (model loaded on first call)"""
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                _reader = easyocr.Reader(
+                    ocr_languages(),
+                    gpu=os.getenv('OCR_GPU', 'False').lower() == 'true',
+                    verbose=False
+                )
+                print("[OCR] EasyOCR model loaded")
+    return _reader
+
+
+def local_engine() -> Optional[str]:
+    """Engine to use, or None if neither is installed"""
+    engine = os.getenv('LOCAL_OCR_ENGINE', 'auto').lower()
+    if engine == 'easyocr':
+        return 'easyocr' if EASYOCR_AVAILABLE else None
+    if engine == 'tesseract':
+        return 'tesseract' if TESSERACT_AVAILABLE else None
+    if EASYOCR_AVAILABLE:
+        return 'easyocr'
+    return 'tesseract' if TESSERACT_AVAILABLE else None
+
+
+def get_tesseract_ocr() -> "LocalOCR":
+    """
+    The process-wide Tesseract engine (for callers that need Tesseract
+    specifically); raises RuntimeError if pytesseract is not installed
+    """
+    global _tesseract
+    if not TESSERACT_AVAILABLE:
+        raise RuntimeError("Tesseract OCR is not installed (pip install pytesseract)")
+    if _tesseract is None:
+        with _reader_lock:
+            if _tesseract is None:
+                _tesseract = LocalOCR(engine='tesseract', workers=1)
+    return _tesseract
+
+
+class LocalOCR:
+    """
+    Offline OCR engine on a bounded worker pool
+    """
+
+    def __init__(self, engine: Optional[str] = None, workers: Optional[int] = None, min_confidence: float = 0.2):
+        self.engine = engine or local_engine()
+        if self.engine is None:
+            raise RuntimeError("No local OCR engine installed (pip install easyocr or pytesseract)")
+        self.min_confidence = min_confidence
+        self.executor = ThreadPoolExecutor(
+            workers or int(os.getenv('LOCAL_OCR_WORKERS', '2')),
+            thread_name_prefix="local-ocr"
+        )
+
+        if self.engine == 'easyocr':
+            get_easyocr_reader()
+
+    @property
+    def version(self) -> str:
+        """Cache version: engine and languages"""
+        return f"{self.engine}-1:{','.join(ocr_languages())}"
+
+    def _prepare(self, image_path: str) -> np.ndarray:
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Cannot read image: {image_path}")
+        return normalize_gray(image)
+
+    def _read_easyocr(self, gray: np.ndarray) -> List[TextPosition]:
+        # EasyOCR format: ((x1,y1),(x2,y2),(x3,y3),(x4,y4)), text, confidence
+        results = get_easyocr_reader().readtext(gray, detail=1, paragraph=False)
+
+        text_positions = []
+        for bbox, text, confidence in results:
+            if confidence < self.min_confidence or not text.strip():
+                continue
+            bbox_array = np.array(bbox)
+            center_y = int(np.mean(bbox_array[:, 1]))
+            center_x = int(np.mean(bbox_array[:, 0]))
+            text_positions.append((text, (center_y, center_x), float(confidence)))
+        return text_positions
+
+    def _read_tesseract(self, gray: np.ndarray) -> List[TextPosition]:
+        lang = "+".join(TESSERACT_LANGUAGES.get(code, code) for code in ocr_languages())
+        data = pytesseract.image_to_data(gray, lang=lang, output_type=pytesseract.Output.DICT)
+
+        texts = np.array(data["text"], dtype=object)
+        confs = np.array(data["conf"], dtype=float) / 100.0  # -1 for non-word boxes
+        lefts = np.array(data["left"])
+        tops = np.array(data["top"])
+        widths = np.array(data["width"])
+        heights = np.array(data["height"])
+
+        keep = (confs >= self.min_confidence) & np.array([bool(str(text).strip()) for text in texts], dtype=bool)
+        return [
+            (str(text), (int(top + height // 2), int(left + width // 2)), float(conf))
+            for text, top, height, left, width, conf in zip(
+                texts[keep], tops[keep], heights[keep], lefts[keep], widths[keep], confs[keep]
+            )
+        ]
+
+    def read(self, image_path: str) -> List[TextPosition]:
+        """Words on the page, in the calling thread"""
+        gray = self._prepare(image_path)
+        if self.engine == 'easyocr':
+            return self._read_easyocr(gray)
+        return self._read_tesseract(gray)
+
+    def extract(self, image_path: str, timeout: Optional[float] = None) -> List[TextPosition]:
+        """
+        Words on the page, read on the worker pool
+        Raises concurrent.futures.TimeoutError if not done within timeout
+        """
+        return self.executor.submit(self.read, image_path).result(timeout=timeout)
@@ -0,0 +1,214 @@
+"""
+OCR response cache - cloud OCR results persisted on disk
+
+Results from Google Cloud Vision and Gemini are stored as normalized
+(text, (y, x), confidence) lists, keyed by the SHA-256 of the image bytes
+plus the backend and its prompt/result version. Re-uploading the same
+page skips the network call entirely; changing the Gemini prompt or model
+changes the key, so stale results are never served.
+
+Entries are JSON files under OCR_CACHE_DIR. The cache is held under
+OCR_CACHE_MAX_MB by evicting the least recently used entries (file mtime
+is refreshed on every hit, so the order survives restarts).
+
+Empty results are never stored: a blank answer or a failed parse would
+otherwise pin the image to [] and skip that backend until eviction.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+TextPosition = Tuple[str, Tuple[int, int], float]
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent.parent / "uploads" / "ocr_cache"
+
+
+def image_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def cache_key(content_hash: str, backend: str, version: str) -> str:
+    return hashlib.sha256(f"{content_hash}|{backend}|{version}".encode("utf-8")).hexdigest()
+
+
+def normalize(text_positions: List[TextPosition]) -> List[TextPosition]:
+    """Plain Python types (NumPy scalars from the backends don't survive JSON)"""
+    return [
+        (str(text), (int(position[0]), int(position[1])), float(confidence))
+        for text, position, confidence in text_positions
+    ]
+
+
+class OCRCache:
+    """
+    Size-bounded, least-recently-used OCR result cache on disk
+    """
+
+    def __init__(self, directory: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.directory = Path(directory or os.getenv('OCR_CACHE_DIR') or DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('OCR_CACHE_MAX_MB', '256')) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.enabled = max_bytes > 0
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size, oldest first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        if self.enabled:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        """Rebuild the LRU order from the files already on disk"""
+        files = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self.total_bytes += size
+        if self._entries:
+            print(f"[OCR] Cache: {len(self._entries)} entries, {self.total_bytes / 1048576:.1f} MB")
+
+    def get(self, key: str) -> Optional[List[TextPosition]]:
+        """Cached result, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        with self._lock:
+            known = key in self._entries
+            if known:
+                self._entries.move_to_end(key)
+
+        data = None
+        if known:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                self._forget(key)
+            if data == []:
+                # Stored before empty results were skipped; treat as a miss
+                self._forget(key)
+                path.unlink(missing_ok=True)
+                data = None
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return [(text, (y, x), confidence) for text, y, x, confidence in data]
+
+    def put(self, key: str, text_positions: List[TextPosition]) -> List[TextPosition]:
+        """Store a non-empty result; returns it normalized, as get() would"""
+        text_positions = normalize(text_positions)
+        if not self.enabled or not text_positions:
+            return text_positions
+
+        payload = json.dumps(
+            [[text, y, x, confidence] for text, (y, x), confidence in text_positions],
+            ensure_ascii=False
+        ).encode("utf-8")
+        if len(payload) > self.max_bytes:
+            return text_positions
+
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[WARN] OCR cache write failed: {e}")
+            return text_positions
+
+        with self._lock:
+            self.total_bytes += len(payload) - self._entries.pop(key, 0)
+            self._entries[key] = len(payload)
+            self.stores += 1
+            evicted = self._evict()
+
+        for old_key in evicted:
+            try:
+                self._path(old_key).unlink()
+            except OSError:
+                pass
+        return text_positions
+
+    def _evict(self) -> List[str]:
+        """Drop least recently used entries until under max_bytes (lock held)"""
+        evicted = []
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            evicted.append(key)
+        return evicted
+
+    def _forget(self, key: str):
+        with self._lock:
+            self.total_bytes -= self._entries.pop(key, 0)
+
+    def clear(self) -> int:
+        """Remove every entry; returns how many were removed"""
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self.total_bytes = 0
+
+        for key in keys:
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+        return len(keys)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "size_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions
+        }
+
+
+_cache: Optional[OCRCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> OCRCache:
+    """The process-level OCR cache (created on first call)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = OCRCache()
+    return _cache
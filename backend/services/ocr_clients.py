@@ -0,0 +1,277 @@
+"""
+OCR backend client pool - one set of cloud OCR clients per process
+
+Backend discovery (which credentials are configured) happens once, and
+each client (Google Cloud Vision ImageAnnotatorClient, Gemini
+GenerativeModel) is created lazily on first use and then reused, so its
+connection stays open across requests instead of being rebuilt for
+every upload.
+
+Each backend is also a circuit breaker: after OCR_BACKEND_MAX_FAILURES
+consecutive failures (errors or calls slower than the dispatch deadline)
+the client is dropped and the breaker opens for
+OCR_BACKEND_COOLDOWN_SECONDS. After the cooldown one trial call is let
+through (half-open) on a freshly built client; success closes the
+breaker, failure opens it again.
+
+GOOGLE_VISION_ENDPOINT / GEMINI_ENDPOINT point the clients at another
+REST endpoint (a proxy, or the local stubs in scripts/ocr_stub_servers.py).
+
+A local engine (EasyOCR or Tesseract, see local_ocr) is the third backend.
+OCR_ROUTING orders the backends: quality (cloud first, local last),
+local_first (offline first, cloud as hedge/fallback) or cost (cheapest
+first by OCR_COST_<BACKEND>, ties in quality order).
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# Google Cloud Vision (primary)
+try:
+    from google.cloud import vision
+    GOOGLE_VISION_AVAILABLE = True
+except ImportError:
+    GOOGLE_VISION_AVAILABLE = False
+
+# Google Gemini Vision (fallback)
+try:
+    import google.generativeai as genai
+    GEMINI_AVAILABLE = True
+except ImportError:
+    GEMINI_AVAILABLE = False
+
+from backend.services.local_ocr import LocalOCR, local_engine
+
+GOOGLE_VISION = "GOOGLE_VISION"
+GEMINI_VISION = "GEMINI_VISION"
+LOCAL_OCR = "LOCAL"
+
+ROUTING_MODES = ("quality", "local_first", "cost")
+
+# Rough USD per page, for cost-aware routing (override with OCR_COST_<BACKEND>)
+DEFAULT_COSTS = {GOOGLE_VISION: 0.0015, GEMINI_VISION: 0.0004, LOCAL_OCR: 0.0}
+
+
+def gemini_api_key() -> Optional[str]:
+    key = os.getenv('GEMINI_API_KEY')
+    return key if key and key != 'your_gemini_api_key' else None
+
+
+def gemini_model_name() -> str:
+    return os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
+
+
+class BackendClient:
+    """
+    Lazily created, shared client for one OCR backend, with health tracking
+    """
+
+    def __init__(
+        self,
+        name: str,
+        configured: bool,
+        factory: Callable,
+        max_failures: int = 3,
+        cooldown_seconds: float = 30.0
+    ):
+        self.name = name
+        self.configured = configured
+        self._factory = factory
+        self.max_failures = max_failures
+        self.cooldown_seconds = cooldown_seconds
+
+        self._client = None
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.tripped = False  # breaker has opened and not yet closed again
+        self.trial_in_flight = False
+        self.last_error: Optional[str] = None
+        self.last_success_at: Optional[float] = None
+        self.calls = 0
+        self.failures = 0
+
+    def available(self) -> bool:
+        """Configured and not cooling down after repeated failures"""
+        return self.configured and time.monotonic() >= self.unhealthy_until
+
+    @property
+    def state(self) -> str:
+        """Circuit breaker state: closed, open or half_open"""
+        if time.monotonic() < self.unhealthy_until:
+            return "open"
+        return "half_open" if self.tripped else "closed"
+
+    def allow_call(self) -> bool:
+        """
+        Whether a call may go out now; in half-open state only one trial
+        call is allowed until its outcome is reported
+        """
+        if not self.available():
+            return False
+        with self._lock:
+            if not self.tripped:
+                return True
+            if self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def get(self):
+        """
+        The shared client, created on first use
+        Creation errors propagate; callers report them like call failures
+        """
+        client = self._client
+        if client is not None:
+            return client
+
+        with self._lock:
+            if self._client is None:
+                self._client = self._factory()
+                print(f"[OCR] {self.name} client ready")
+            return self._client
+
+    def report_success(self):
+        with self._lock:
+            self.calls += 1
+            self.consecutive_failures = 0
+            self.last_success_at = time.time()
+            if self.tripped:
+                print(f"[OCR] {self.name} recovered")
+            self.tripped = False
+            self.trial_in_flight = False
+
+    def report_failure(self, error: Exception):
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error) or type(error).__name__
+            # A failed half-open trial reopens the breaker straight away
+            if self.consecutive_failures >= self.max_failures or self.trial_in_flight:
+                # Drop the client; a fresh one is built after the cooldown
+                self._client = None
+                self.unhealthy_until = time.monotonic() + self.cooldown_seconds
+                self.consecutive_failures = 0
+                self.tripped = True
+                self.trial_in_flight = False
+                print(f"[OCR] {self.name} unhealthy for {self.cooldown_seconds:g}s: {self.last_error}")
+
+    def status(self) -> Dict:
+        return {
+            "configured": self.configured,
+            "available": self.available(),
+            "state": self.state,
+            "connected": self._client is not None,
+            "calls": self.calls,
+            "failures": self.failures,
+            "cooldown_remaining_seconds": round(max(0.0, self.unhealthy_until - time.monotonic()), 1),
+            "last_error": self.last_error,
+            "last_success_at": self.last_success_at
+        }
+
+
+def _create_vision_client():
+    endpoint = os.getenv('GOOGLE_VISION_ENDPOINT')
+    if not endpoint:
+        return vision.ImageAnnotatorClient()
+
+    # Custom endpoint over REST; local stubs need no credentials
+    credentials = None
+    if not os.getenv('GOOGLE_APPLICATION_CREDENTIALS'):
+        from google.auth.credentials import AnonymousCredentials
+        credentials = AnonymousCredentials()
+    return vision.ImageAnnotatorClient(
+        credentials=credentials,
+        transport="rest",
+        client_options={"api_endpoint": endpoint}
+    )
+
+
+def _create_gemini_model():
+    endpoint = os.getenv('GEMINI_ENDPOINT')
+    if endpoint:
+        genai.configure(api_key=gemini_api_key(), transport="rest", client_options={"api_endpoint": endpoint})
+    else:
+        genai.configure(api_key=gemini_api_key())
+    return genai.GenerativeModel(gemini_model_name())
+
+
+class OCRClientPool:
+    """
+    Process-wide OCR backends in priority order:
+    Google Cloud Vision (90%+) -> Gemini Vision (90%+ for handwriting)
+    """
+
+    def __init__(self):
+        max_failures = int(os.getenv('OCR_BACKEND_MAX_FAILURES', '3'))
+        cooldown = float(os.getenv('OCR_BACKEND_COOLDOWN_SECONDS', '30'))
+
+        self.clients: Dict[str, BackendClient] = {
+            GOOGLE_VISION: BackendClient(
+                GOOGLE_VISION,
+                GOOGLE_VISION_AVAILABLE and bool(os.getenv('GOOGLE_APPLICATION_CREDENTIALS') or os.getenv('GOOGLE_VISION_ENDPOINT')),
+                _create_vision_client,
+                max_failures,
+                cooldown
+            ),
+            GEMINI_VISION: BackendClient(
+                GEMINI_VISION,
+                GEMINI_AVAILABLE and gemini_api_key() is not None,
+                _create_gemini_model,
+                max_failures,
+                cooldown
+            ),
+            LOCAL_OCR: BackendClient(
+                LOCAL_OCR,
+                os.getenv('LOCAL_OCR_ENABLED', 'True').lower() == 'true' and local_engine() is not None,
+                LocalOCR,
+                max_failures,
+                cooldown
+            )
+        }
+
+        self.routing = os.getenv('OCR_ROUTING', 'quality').lower()
+        if self.routing not in ROUTING_MODES:
+            print(f"[WARN] Unknown OCR_ROUTING '{self.routing}', using quality")
+            self.routing = 'quality'
+        self.costs = {
+            name: float(os.getenv(f'OCR_COST_{name}', str(cost)))
+            for name, cost in DEFAULT_COSTS.items()
+        }
+
+    def __getitem__(self, name: str) -> BackendClient:
+        return self.clients[name]
+
+    def configured_backends(self) -> List[str]:
+        """Configured backends in routing order"""
+        names = [name for name, client in self.clients.items() if client.configured]
+        if self.routing == 'local_first':
+            return sorted(names, key=lambda name: name != LOCAL_OCR)
+        if self.routing == 'cost':
+            return sorted(names, key=lambda name: self.costs.get(name, 0.0))
+        return names
+
+    def available_backends(self) -> List[str]:
+        """Configured backends not cooling down, in routing order"""
+        return [name for name in self.configured_backends() if self.clients[name].available()]
+
+    def health(self) -> Dict:
+        return {name: client.status() for name, client in self.clients.items()}
+
+
+_pool: Optional[OCRClientPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_clients() -> OCRClientPool:
+    """The process-level client pool (created on first call)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OCRClientPool()
+    return _pool
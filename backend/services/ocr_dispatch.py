@@ -0,0 +1,164 @@
+"""
+OCR dispatch - hedged, deadline-bounded calls across the cloud backends
+
+Backends are tried in priority order, but the next one does not wait for
+the previous one to fail: if no usable answer has arrived within
+OCR_HEDGE_DELAY_SECONDS a hedged request goes to the next backend, and
+the first non-empty result wins. A failure or an empty result launches
+the next backend immediately. Nothing waits past OCR_DEADLINE_SECONDS.
+
+Calls run on a shared thread pool. Every call reports its outcome to its
+backend's circuit breaker (see ocr_clients); a call that finishes after
+the deadline counts as a failure, so a backend that keeps timing out is
+taken out of rotation like one that keeps erroring. Losing hedged calls
+are left to finish in the background and still report their outcome.
+"""
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from backend.services.ocr_clients import OCRClientPool, get_ocr_clients
+
+TextPosition = Tuple[str, Tuple[int, int], float]
+BackendCall = Tuple[str, Callable[[float], List[TextPosition]]]  # (backend, fn(timeout_seconds))
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class OCRDispatcher:
+    """
+    Runs one OCR request across the backends with hedging and a deadline
+    """
+
+    def __init__(
+        self,
+        clients: OCRClientPool,
+        hedge_delay: Optional[float] = None,
+        deadline: Optional[float] = None,
+        workers: Optional[int] = None
+    ):
+        self.clients = clients
+        # A negative hedge delay disables hedging (plain sequential fallback)
+        self.hedge_delay = float(os.getenv('OCR_HEDGE_DELAY_SECONDS', '2.0')) if hedge_delay is None else hedge_delay
+        self.deadline = float(os.getenv('OCR_DEADLINE_SECONDS', '30')) if deadline is None else deadline
+        self.executor = ThreadPoolExecutor(
+            workers or int(os.getenv('OCR_DISPATCH_WORKERS', '8')),
+            thread_name_prefix="ocr-dispatch"
+        )
+
+        self.requests = 0
+        self.hedges = 0
+        self.deadline_misses = 0
+        self.wins: Dict[str, int] = {}
+
+    def _run(self, backend: str, call: Callable[[float], List[TextPosition]], timeout: float) -> List[TextPosition]:
+        """One backend call, with its outcome reported to the breaker"""
+        client = self.clients[backend]
+        started = time.monotonic()
+        try:
+            result = call(timeout)
+        except Exception as e:
+            client.report_failure(e)
+            raise
+
+        elapsed = time.monotonic() - started
+        if elapsed > timeout:
+            client.report_failure(DeadlineExceeded(f"{backend} answered after {elapsed:.1f}s"))
+        else:
+            client.report_success()
+        return result
+
+    def dispatch(self, calls: Sequence[BackendCall]) -> Tuple[Optional[str], List[TextPosition]]:
+        """
+        Run calls (best backend first) until one returns a non-empty result
+        Returns (backend, text_positions); (None, []) if none answered in time
+        """
+        self.requests += 1
+        start = time.monotonic()
+        deadline_at = start + self.deadline
+        queue = list(calls)
+        pending = {}
+        empty_from = None
+        last_error = None
+
+        def launch() -> bool:
+            while queue:
+                backend, call = queue.pop(0)
+                if self.clients[backend].allow_call():
+                    remaining = max(0.0, deadline_at - time.monotonic())
+                    pending[self.executor.submit(self._run, backend, call, remaining)] = backend
+                    return True
+            return False
+
+        launch()
+        next_hedge_at = start + self.hedge_delay if self.hedge_delay >= 0 else None
+
+        while pending:
+            now = time.monotonic()
+            wake_at = deadline_at
+            if queue and next_hedge_at is not None:
+                wake_at = min(wake_at, next_hedge_at)
+
+            done, _ = wait(list(pending), timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = f"{backend}: {e}"
+                    print(f"[ERROR] {backend} OCR failed: {e}")
+                    result = None
+
+                if result:
+                    self.wins[backend] = self.wins.get(backend, 0) + 1
+                    return backend, result
+                if result is not None and empty_from is None:
+                    empty_from = backend
+
+                # Failed or empty: go to the next backend right away
+                if queue:
+                    print(f"[OCR] {backend} gave no result, falling back...")
+                    launch()
+
+            now = time.monotonic()
+            if now >= deadline_at:
+                if pending:
+                    self.deadline_misses += 1
+                    print(f"[WARN] OCR deadline of {self.deadline:g}s reached, waiting on {', '.join(pending.values())}")
+                break
+
+            if not done and queue and next_hedge_at is not None and now >= next_hedge_at:
+                if launch():
+                    self.hedges += 1
+                    print(f"[OCR] No answer after {self.hedge_delay:.1f}s, hedging with {list(pending.values())[-1]}")
+                next_hedge_at = now + self.hedge_delay
+
+        if empty_from is None and last_error and not pending:
+            print(f"[WARN] All OCR backends failed, last error: {last_error}")
+        return empty_from, []
+
+    def stats(self) -> Dict:
+        return {
+            "hedge_delay_seconds": self.hedge_delay,
+            "deadline_seconds": self.deadline,
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "deadline_misses": self.deadline_misses,
+            "wins": dict(self.wins)
+        }
+
+
+_dispatcher: Optional[OCRDispatcher] = None
+
+
+def get_ocr_dispatcher() -> OCRDispatcher:
+    """The process-level dispatcher over the shared client pool"""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = OCRDispatcher(get_ocr_clients())
+    return _dispatcher
@@ -0,0 +1,329 @@
+"""
+OCR jobs - book-to-Excel conversions run by background workers
+
+Jobs and their output files are rows in ocr_jobs, so status, downloads
+and the per-user file list work from any uvicorn worker and survive
+restarts (uploads and Excel files are on the shared uploads directory).
+
+Every process runs a JobRunner. It claims queued jobs with a
+compare-and-swap UPDATE (status queued -> running), so each job runs
+exactly once whichever process picks it up, and runs up to
+OCR_JOB_WORKERS of them at a time. Enqueuing in the same process wakes
+the runner at once; other processes find the job on their next poll
+(OCR_JOB_POLL_SECONDS). Running jobs refresh updated_at as pages finish;
+a job whose worker died is re-queued after OCR_JOB_STALE_SECONDS. Every
+progress and result write is conditional on the job still being running
+and claimed by this worker, so if a slow job was re-queued and picked up
+elsewhere, the old run's writes are dropped. Each run writes its workbook
+to a file of its own and moves it into place only while it still owns
+the job, so two runs never write the same file.
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from backend.models.database import OCRJob, SessionLocal
+from backend.services.book_conversion import convert_book
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+def book_inputs(directory: Path) -> List[Path]:
+    """Uploaded files of a book job, in upload order"""
+    return sorted(path for path in directory.iterdir() if path.is_file())
+
+
+def job_dict(job: OCRJob, include_pages: bool = True) -> Dict:
+    data = {
+        "job_id": job.id,
+        "file_id": job.id,
+        "kind": job.kind,
+        "layout": job.layout,
+        "status": job.status,
+        "pages_done": job.pages_done or 0,
+        "pages_total": job.pages_total,
+        "pages_succeeded": job.pages_succeeded,
+        "rows_extracted": job.rows_extracted,
+        "columns_detected": job.columns_detected,
+        "confidence": job.confidence,
+        "backend": job.backend,
+        "error": job.error,
+        "processing_ms": job.processing_ms,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status_url": f"/api/ocr/jobs/{job.id}",
+        "download_url": f"/api/ocr/download-excel/{job.id}" if job.status == "done" else None
+    }
+    if include_pages:
+        data["preview"] = job.preview
+        data["pages"] = json.loads(job.pages) if job.pages else []
+    return data
+
+
+class JobRunner:
+    """
+    Claims queued OCR jobs and runs up to `workers` of them at a time
+    """
+
+    def __init__(
+        self,
+        ocr_factory: Callable,
+        workers: Optional[int] = None,
+        poll_seconds: Optional[float] = None,
+        stale_seconds: Optional[float] = None
+    ):
+        self.ocr_factory = ocr_factory
+        self.workers = workers or int(os.getenv('OCR_JOB_WORKERS', '2'))
+        self.poll_seconds = poll_seconds or float(os.getenv('OCR_JOB_POLL_SECONDS', '2'))
+        self.stale_seconds = stale_seconds or float(os.getenv('OCR_JOB_STALE_SECONDS', '900'))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._slots = threading.Semaphore(self.workers)
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Creating jobs
+
+    def create_job(
+        self,
+        db: Session,
+        username: str,
+        input_path: Path,
+        excel_path: Path,
+        kind: str = "image",
+        layout: Optional[str] = None,
+        job_id: Optional[str] = None,
+        queued: bool = True
+    ) -> OCRJob:
+        """
+        Record a job; queued jobs are picked up by a runner, otherwise the
+        caller runs it with run_job (it is claimed for this process already)
+        """
+        now = datetime.utcnow()
+        job = OCRJob(
+            id=job_id or str(uuid.uuid4()),
+            username=username,
+            kind=kind,
+            layout=layout,
+            status="queued" if queued else "running",
+            worker=None if queued else self.worker_id,
+            input_path=str(input_path),
+            excel_path=str(excel_path),
+            pages_done=0,
+            created_at=now,
+            started_at=None if queued else now,
+            updated_at=now
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+
+        if queued:
+            self._wake.set()
+        return job
+
+    # Claiming
+
+    def _claim_next(self, db: Session) -> Optional[str]:
+        """Oldest queued job, atomically marked running for this worker"""
+        candidates = db.query(OCRJob.id).filter(
+            OCRJob.status == "queued"
+        ).order_by(OCRJob.created_at).limit(self.workers).all()
+
+        for (job_id,) in candidates:
+            now = datetime.utcnow()
+            claimed = db.execute(
+                update(OCRJob)
+                .where(OCRJob.id == job_id, OCRJob.status == "queued")
+                .values(status="running", worker=self.worker_id, started_at=now, updated_at=now)
+            ).rowcount
+            db.commit()
+            if claimed:
+                return job_id
+        return None
+
+    def requeue_stale(self, db: Session) -> int:
+        """Put running jobs whose worker stopped reporting back in the queue"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        count = db.execute(
+            update(OCRJob)
+            .where(OCRJob.status == "running", OCRJob.updated_at < cutoff)
+            .values(status="queued", worker=None, pages_done=0)
+        ).rowcount
+        db.commit()
+        if count:
+            print(f"🔁 Re-queued {count} stale OCR jobs")
+        return count
+
+    # Running
+
+    def _owned(self, job_id: str):
+        """WHERE clause: the job is still running under this worker's claim"""
+        return (OCRJob.id == job_id, OCRJob.status == "running", OCRJob.worker == self.worker_id)
+
+    def _progress(self, job_id: str, pages_done: int):
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(OCRJob)
+                .where(*self._owned(job_id))
+                .values(pages_done=pages_done, updated_at=datetime.utcnow())
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _convert(self, job: OCRJob, excel_path: Path) -> Dict:
+        """Run the OCR for a job into excel_path; returns the columns to store on success"""
+        ocr = self.ocr_factory()
+
+        if job.kind == "book":
+            pages_done = 0
+
+            def on_page(page: Dict):
+                nonlocal pages_done
+                pages_done += 1
+                self._progress(job.id, pages_done)
+
+            work_dir = Path(job.input_path) / f"pages-{excel_path.stem}"
+            try:
+                result = convert_book(
+                    ocr,
+                    book_inputs(Path(job.input_path)),
+                    work_dir,
+                    excel_path,
+                    job.layout or "sheets",
+                    on_page=on_page
+                )
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            if result["pages_succeeded"] == 0:
+                raise ValueError("OCR failed on every page")
+            ok_pages = [page for page in result["pages"] if page["status"] == "ok"]
+            return {
+                "pages_done": result["pages_total"],
+                "pages_total": result["pages_total"],
+                "pages_succeeded": result["pages_succeeded"],
+                "rows_extracted": result["rows_extracted"],
+                "columns_detected": max(page["columns"] for page in ok_pages),
+                "confidence": round(sum(page["confidence"] for page in ok_pages) / len(ok_pages), 2),
+                "backend": ok_pages[0]["backend"],
+                "pages": json.dumps(result["pages"]),
+                "processing_ms": result["elapsed_ms"]
+            }
+
+        started = time.perf_counter()
+        result = ocr.extract_table_from_image(job.input_path)
+        if not result["success"]:
+            raise ValueError(result.get("error", "OCR processing failed"))
+        ocr.save_to_excel(result["data"], str(excel_path))
+        return {
+            "pages_done": 1,
+            "pages_total": 1,
+            "pages_succeeded": 1,
+            "rows_extracted": result["rows_extracted"],
+            "columns_detected": result["columns_detected"],
+            "confidence": round(result["confidence"] * 100, 2),
+            "backend": result.get("backend"),
+            "preview": result["preview"],
+            "processing_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    def run_job(self, job_id: str) -> Dict:
+        """Run a job claimed by this process; returns its final job_dict"""
+        db = SessionLocal()
+        try:
+            job = db.query(OCRJob).filter(OCRJob.id == job_id).first()
+            if job is None:
+                raise ValueError(f"OCR job {job_id} not found")
+
+            # This run's own output; moved to the job's excel_path only if we still own the job
+            excel_path = Path(job.excel_path)
+            run_path = excel_path.with_name(f"{excel_path.stem}.{os.getpid()}-{threading.get_ident()}{excel_path.suffix}")
+            try:
+                values = self._convert(job, run_path)
+                values["status"] = "done"
+                error = None
+            except Exception as e:
+                values = {"status": "failed", "error": str(e)}
+                error = e
+
+            now = datetime.utcnow()
+            values.update(finished_at=now, updated_at=now)
+            owned = db.execute(update(OCRJob).where(*self._owned(job_id)).values(**values)).rowcount
+            db.commit()
+
+            if owned and error is None:
+                os.replace(run_path, excel_path)
+                print(f"✅ OCR job {job_id} done ({values['rows_extracted']} rows)")
+            else:
+                if run_path.exists():
+                    os.remove(run_path)
+                if not owned:
+                    # Re-queued while we ran: the current owner writes the result and the file
+                    print(f"⚠️ OCR job {job_id} was taken over by another worker, result dropped")
+                else:
+                    print(f"❌ OCR job {job_id} failed: {error}")
+
+            db.refresh(job)
+            return job_dict(job)
+        finally:
+            db.close()
+
+    def _run_and_release(self, job_id: str):
+        try:
+            self.run_job(job_id)
+        except Exception as e:
+            print(f"❌ OCR job {job_id} crashed: {e}")
+        finally:
+            self._slots.release()
+            self._wake.set()
+
+    def _loop(self):
+        last_stale_check = 0.0
+        while True:
+            self._slots.acquire()
+            job_id = None
+            try:
+                db = SessionLocal()
+                try:
+                    if time.monotonic() - last_stale_check > 60:
+                        self.requeue_stale(db)
+                        last_stale_check = time.monotonic()
+                    job_id = self._claim_next(db)
+                finally:
+                    db.close()
+            except Exception as e:
+                print(f"⚠️ OCR job runner error: {e}")
+
+            if job_id is None:
+                self._slots.release()
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+
+            threading.Thread(
+                target=self._run_and_release, args=(job_id,), name=f"ocr-job-{job_id[:8]}", daemon=True
+            ).start()
+
+    def start(self):
+        """Start claiming jobs in a daemon thread (once per process)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="ocr-job-runner", daemon=True)
+            self._thread.start()
+            print(f"✅ OCR job runner started ({self.workers} workers, {self.worker_id})")
@@ -1,16 +1,18 @@
-import easyocr
 import cv2
 import numpy as np
 from datetime import datetime
 import re
 from typing import Dict, Optional
 
+from backend.services.image_preprocessing import denoise, equalize, to_gray
+from backend.services.local_ocr import get_easyocr_reader
+
 class PaymentOCR:
     """OCR service for extracting payment information from screenshots"""
     
     def __init__(self):
-        # Initialize EasyOCR with Indonesian and English
-        self.reader = easyocr.Reader(['id', 'en'], gpu=False)
+        # Shared EasyOCR reader (Indonesian and English by default, see OCR_LANGUAGES)
+        self.reader = get_easyocr_reader()
         
     def extract_payment_info(self, image_path: str) -> Dict:
         """
@@ -36,22 +38,21 @@ class PaymentOCR:
             
             # Pass 2: Grayscale (good for general use)
             print("   Pass 2: Grayscale...")
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = to_gray(image)
             results2 = self.reader.readtext(gray)
             texts2 = [(text, conf, "gray") for bbox, text, conf in results2]
             all_texts.extend(texts2)
             
             # Pass 3: Contrast enhanced (good for low contrast text)
             print("   Pass 3: Contrast enhanced...")
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            enhanced = clahe.apply(gray)
+            enhanced = equalize(gray, clip_limit=2.0)
             results3 = self.reader.readtext(enhanced)
             texts3 = [(text, conf, "enhanced") for bbox, text, conf in results3]
             all_texts.extend(texts3)
             
             # Pass 4: Denoised (good for noisy images)
             print("   Pass 4: Denoised...")
-            denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+            denoised = denoise(gray, "nlmeans", strength=10)
             results4 = self.reader.readtext(denoised)
             texts4 = [(text, conf, "denoised") for bbox, text, conf in results4]
             all_texts.extend(texts4)
@@ -0,0 +1,172 @@
+"""
+In-memory fuzzy index of product names for invoice line matching
+
+Names are normalized (lowercase, punctuation, quantities and Indonesian
+units stripped) and split into character trigrams, pg_trgm style. An
+inverted index from trigram to product ids lets a lookup touch only the
+products that share a trigram with the query, and candidates are ranked
+by trigram similarity (shared / union).
+
+Each process holds its own index, so it is rebuilt periodically (see
+main.py) to pick up products written by other workers or scripts; the
+rebuild fills fresh dicts and swaps them in, so lookups never see a
+half-built index.
+"""
+
+import heapq
+import re
+import threading
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+# Units and packaging words commonly found on Indonesian supplier invoices
+UNIT_WORDS = {
+    "kg", "kilo", "kilogram", "g", "gr", "gram", "ons", "mg",
+    "l", "lt", "ltr", "liter", "litre", "ml", "cc",
+    "pcs", "pc", "biji", "bh", "buah", "unit", "ekor",
+    "box", "dus", "karton", "krt", "ctn", "pack", "pak", "pck", "bungkus", "bks",
+    "sachet", "sct", "botol", "btl", "kaleng", "klg", "toples", "galon",
+    "sak", "karung", "krg", "ikat", "iket", "renteng", "rtg",
+    "lusin", "lsn", "kodi", "rim", "roll", "lembar", "lbr", "set", "pasang", "psg",
+    "isi", "x"
+}
+
+_QUANTITY = re.compile(r"^(\d+(?:[.,]\d+)?)([a-z]*)$")
+_NON_WORD = re.compile(r"[^a-z0-9.,]+")
+
+
+def _is_quantity(token: str, next_token: Optional[str]) -> bool:
+    """"500ml", "2l" or a bare number followed by a unit word ("50 kg")"""
+    match = _QUANTITY.match(token)
+    if not match:
+        return False
+    suffix = match.group(2)
+    if suffix:
+        return suffix in UNIT_WORDS
+    return next_token in UNIT_WORDS
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, drop punctuation, quantities ("500ml", "50 kg") and unit words"""
+    tokens = [
+        token.strip(".,")
+        for token in _NON_WORD.sub(" ", (name or "").lower()).split()
+    ]
+    tokens = [token for token in tokens if token]
+    kept = [
+        token for i, token in enumerate(tokens)
+        if token not in UNIT_WORDS
+        and not _is_quantity(token, tokens[i + 1] if i + 1 < len(tokens) else None)
+    ]
+    # A name made only of units/quantities is still better than nothing
+    return " ".join(kept or tokens)
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """Character trigrams per word, padded like pg_trgm ("  w", " wo", ..., "rd ")"""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class ProductNameIndex:
+    """
+    Trigram index over product names, kept in sync with product writes
+    """
+
+    def __init__(self, min_score: float = 0.3):
+        self.min_score = min_score
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._grams: Dict[int, FrozenSet[str]] = {}
+        self._names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._grams)
+
+    def build(self, db: Session):
+        """(Re)build the index from the products table"""
+        from backend.models.database import Product
+
+        postings: Dict[str, Set[int]] = defaultdict(set)
+        grams_by_id: Dict[int, FrozenSet[str]] = {}
+        names: Dict[int, str] = {}
+        for product_id, name in db.query(Product.id, Product.name).all():
+            grams = trigrams(normalize_name(name))
+            grams_by_id[product_id] = grams
+            names[product_id] = name
+            for gram in grams:
+                postings[gram].add(product_id)
+
+        with self._lock:
+            self._postings, self._grams, self._names = postings, grams_by_id, names
+
+    def add(self, product_id: int, name: str):
+        """Index a new product, or re-index a renamed one"""
+        grams = trigrams(normalize_name(name))
+        with self._lock:
+            self._remove(product_id)
+            self._grams[product_id] = grams
+            self._names[product_id] = name
+            for gram in grams:
+                self._postings[gram].add(product_id)
+
+    def remove(self, product_id: int):
+        """Drop a product from the index (no-op if it isn't indexed)"""
+        with self._lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id: int):
+        for gram in self._grams.pop(product_id, ()):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(product_id)
+                if not postings:
+                    del self._postings[gram]
+        self._names.pop(product_id, None)
+
+    def search(
+        self,
+        query: str,
+        limit: int = 5,
+        min_score: Optional[float] = None
+    ) -> List[Tuple[int, str, float]]:
+        """
+        Ranked candidates for a free-text name
+        Returns [(product_id, name, similarity)], best first
+        """
+        min_score = self.min_score if min_score is None else min_score
+        query_grams = trigrams(normalize_name(query))
+        if not query_grams:
+            return []
+
+        # similarity <= shared / len(query), so low counts can be skipped unscored
+        size = len(query_grams)
+        floor = min_score * size
+        with self._lock:
+            # Count shared trigrams per candidate (Counter does the loop in C)
+            shared = Counter(chain.from_iterable(
+                self._postings.get(gram, ()) for gram in query_grams
+            ))
+            grams = self._grams
+            scored = [
+                (product_id, count / (size + len(grams[product_id]) - count))
+                for product_id, count in shared.items()
+                if count >= floor
+            ]
+            best = heapq.nlargest(
+                limit,
+                (candidate for candidate in scored if candidate[1] >= min_score),
+                key=lambda candidate: candidate[1]
+            )
+            return [(product_id, self._names[product_id], round(score, 4)) for product_id, score in best]
+
+    def best_match(self, query: str, min_score: Optional[float] = None) -> Optional[Tuple[int, str, float]]:
+        """Single best candidate, or None if nothing clears min_score"""
+        candidates = self.search(query, limit=1, min_score=min_score)
+        return candidates[0] if candidates else None
@@ -0,0 +1,156 @@
+"""
+Daily sales rollup - per-product, per-day sales totals
+
+The `daily_product_sales` table is updated in the same transaction as each
+sale movement, so forecasts and sales analytics read O(days) rows instead
+of rescanning `stock_movements`.
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from backend.models.database import DailyProductSales, StockMovement, dialect_insert
+
+
+def record_daily_sales(db: Session, movements: Iterable[Dict]) -> None:
+    """
+    Add sale movements to the rollup (does not commit)
+    
+    movements: dicts with product_id, quantity (negative for sale) and created_at
+    """
+    totals = {}
+    for movement in movements:
+        sale_date = (movement.get("created_at") or datetime.utcnow()).date()
+        key = (movement["product_id"], sale_date)
+        quantity, transactions = totals.get(key, (0, 0))
+        totals[key] = (quantity - movement["quantity"], transactions + 1)
+    
+    if not totals:
+        return
+    
+    table = DailyProductSales.__table__
+    stmt = dialect_insert(db, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["product_id", "sale_date"],
+        set_={
+            "quantity": table.c.quantity + stmt.excluded.quantity,
+            "transactions": table.c.transactions + stmt.excluded.transactions,
+            "updated_at": stmt.excluded.updated_at
+        }
+    )
+    now = datetime.utcnow()
+    db.execute(stmt, [
+        {
+            "product_id": product_id,
+            "sale_date": sale_date,
+            "quantity": quantity,
+            "transactions": transactions,
+            "updated_at": now
+        }
+        for (product_id, sale_date), (quantity, transactions) in totals.items()
+    ])
+
+
+def _ledger_daily_sales(since: Optional[date] = None):
+    """Grouped SELECT of daily sales straight from the stock ledger"""
+    sale_day = func.date(StockMovement.created_at)
+    query = select(
+        StockMovement.product_id,
+        sale_day.label("sale_date"),
+        func.sum(-StockMovement.quantity).label("quantity"),
+        func.count(StockMovement.id).label("transactions")
+    ).where(StockMovement.movement_type == "sale")
+    
+    if since is not None:
+        query = query.where(StockMovement.created_at >= datetime.combine(since, datetime.min.time()))
+    
+    return query.group_by(StockMovement.product_id, sale_day)
+
+
+def backfill_daily_sales(db: Session, since: Optional[date] = None) -> int:
+    """
+    Rebuild the rollup from the stock ledger (all days, or from `since`)
+    Returns the number of rollup rows written
+    """
+    table = DailyProductSales.__table__
+    clear = delete(table)
+    if since is not None:
+        clear = clear.where(table.c.sale_date >= since)
+    db.execute(clear)
+    
+    ledger = _ledger_daily_sales(since).subquery()
+    db.execute(
+        table.insert().from_select(
+            ["product_id", "sale_date", "quantity", "transactions", "updated_at"],
+            select(
+                ledger.c.product_id,
+                ledger.c.sale_date,
+                ledger.c.quantity,
+                ledger.c.transactions,
+                func.current_timestamp()
+            )
+        )
+    )
+    db.commit()
+    
+    query = db.query(func.count(DailyProductSales.id))
+    if since is not None:
+        query = query.filter(DailyProductSales.sale_date >= since)
+    return query.scalar() or 0
+
+
+def check_daily_sales_consistency(
+    db: Session,
+    since: Optional[date] = None,
+    tolerance: float = 1e-6
+) -> List[Dict]:
+    """
+    Compare the rollup against the raw ledger
+    Returns one entry per (product, day) that disagrees; empty means consistent
+    """
+    columns = ["product_id", "sale_date", "quantity", "transactions"]
+    ledger = pd.DataFrame(db.execute(_ledger_daily_sales(since)).all(), columns=columns)
+    
+    rollup_query = select(
+        DailyProductSales.product_id,
+        DailyProductSales.sale_date,
+        DailyProductSales.quantity,
+        DailyProductSales.transactions
+    )
+    if since is not None:
+        rollup_query = rollup_query.where(DailyProductSales.sale_date >= since)
+    rollup = pd.DataFrame(db.execute(rollup_query).all(), columns=columns)
+    
+    # func.date() comes back as text on SQLite
+    for df in (ledger, rollup):
+        df["sale_date"] = pd.to_datetime(df["sale_date"]).dt.date
+    
+    merged = ledger.merge(
+        rollup, on=["product_id", "sale_date"], how="outer",
+        suffixes=("_ledger", "_rollup")
+    ).fillna(0)
+    
+    mismatched = merged[
+        ((merged["quantity_ledger"] - merged["quantity_rollup"]).abs() > tolerance)
+        | (merged["transactions_ledger"] != merged["transactions_rollup"])
+    ]
+    
+    return [
+        {
+            "product_id": int(row.product_id),
+            "sale_date": row.sale_date.isoformat(),
+            "ledger_quantity": float(row.quantity_ledger),
+            "rollup_quantity": float(row.quantity_rollup),
+            "ledger_transactions": int(row.transactions_ledger),
+            "rollup_transactions": int(row.transactions_rollup)
+        }
+        for row in mismatched.itertuples(index=False)
+    ]
@@ -0,0 +1,143 @@
+"""
+Low-stock alert set - maintained incrementally as stock changes
+
+Every stock write also sets products.stock_status ("ok", "low" or "out"),
+an indexed column, so flagged products can be read without scanning the
+whole table. On top of it an in-process cache of the flagged products is
+updated by the same write paths, and alerts are served from memory in
+O(alerts) instead of O(products).
+
+The column is the source of truth: the cache is rebuilt from it at
+startup (sync) and can be reloaded at any time.
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, or_, update
+from sqlalchemy.orm import Session
+
+from backend.models.database import Product
+
+OK, LOW, OUT = "ok", "low", "out"
+
+
+def stock_status(current_stock: Optional[float], min_stock: Optional[float]) -> str:
+    """"out" at or below zero, "low" at or below min_stock, otherwise "ok" """
+    current_stock = current_stock or 0
+    if current_stock <= 0:
+        return OUT
+    if current_stock <= (min_stock or 0):
+        return LOW
+    return OK
+
+
+def stock_status_expression(current_stock, min_stock):
+    """The same rule as stock_status, as a SQL CASE over column expressions"""
+    current_stock = func.coalesce(current_stock, 0)
+    return case(
+        (current_stock <= 0, OUT),
+        (current_stock <= func.coalesce(min_stock, 0), LOW),
+        else_=OK
+    )
+
+
+class StockAlerts:
+    """
+    In-process cache of products flagged "low" or "out"
+    """
+
+    def __init__(self):
+        self._alerts: Dict[int, Dict] = {}
+        self._out_count = 0
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def sync(self, db: Session) -> int:
+        """
+        Re-flag rows whose stock_status disagrees with their stock (e.g.
+        written before the column existed, or by a script), then reload
+        Returns the number of rows fixed
+        """
+        products = Product.__table__
+        expected = stock_status_expression(products.c.current_stock, products.c.min_stock)
+        result = db.execute(
+            update(products)
+            .where(or_(products.c.stock_status.is_(None), products.c.stock_status != expected))
+            .values(stock_status=expected)
+        )
+        db.commit()
+        self.load(db)
+        return result.rowcount
+
+    def load(self, db: Session):
+        """Rebuild the cache from the stock_status index"""
+        rows = db.query(
+            Product.id, Product.name, Product.unit, Product.current_stock, Product.min_stock
+        ).filter(Product.stock_status != OK).all()
+
+        with self._lock:
+            self._alerts.clear()
+            self._out_count = 0
+            self.loaded = True
+        self.track_many({row[0]: tuple(row[1:]) for row in rows})
+
+    def track(
+        self,
+        product_id: int,
+        name: str,
+        unit: Optional[str],
+        current_stock: float,
+        min_stock: float
+    ):
+        """Record a product's new stock level, flagging or clearing it"""
+        status = stock_status(current_stock, min_stock)
+
+        with self._lock:
+            previous = self._alerts.pop(product_id, None)
+            if previous is not None and previous["status"] == OUT:
+                self._out_count -= 1
+
+            if status != OK:
+                self._alerts[product_id] = {
+                    "product_id": product_id,
+                    "name": name,
+                    "unit": unit,
+                    "current_stock": current_stock,
+                    "min_stock": min_stock,
+                    "status": status
+                }
+                if status == OUT:
+                    self._out_count += 1
+
+    def track_many(self, changes: Dict[int, Tuple]):
+        """changes: {product_id: (name, unit, current_stock, min_stock)}"""
+        for product_id, (name, unit, current_stock, min_stock) in changes.items():
+            self.track(product_id, name, unit, current_stock, min_stock)
+
+    def remove(self, product_id: int):
+        """Forget a deleted product"""
+        with self._lock:
+            previous = self._alerts.pop(product_id, None)
+            if previous is not None and previous["status"] == OUT:
+                self._out_count -= 1
+
+    def _ensure_loaded(self, db: Optional[Session]):
+        if not self.loaded and db is not None:
+            self.load(db)
+
+    def alerts(self, db: Optional[Session] = None) -> List[Dict]:
+        """Flagged products, ordered by product id"""
+        self._ensure_loaded(db)
+        with self._lock:
+            return [dict(alert) for _, alert in sorted(self._alerts.items())]
+
+    def counts(self, db: Optional[Session] = None) -> Dict[str, int]:
+        """{"low_stock": flagged products, "out_of_stock": products at zero}"""
+        self._ensure_loaded(db)
+        with self._lock:
+            return {"low_stock": len(self._alerts), "out_of_stock": self._out_count}
@@ -0,0 +1,191 @@
+"""
+Stock history - keyset pagination, daily aggregation and streamed export
+
+All queries walk the (product_id, created_at, id) index on
+stock_movements newest first. Pages continue from an opaque cursor
+holding the last (created_at, id) seen, so page N costs the same as page
+1, and exports stream the ledger in keyset batches instead of loading
+it whole.
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import case, func, tuple_
+from sqlalchemy.orm import Session
+
+from backend.models.database import StockMovement
+
+# Columns served by the history API (the index covers them on PostgreSQL)
+HISTORY_COLUMNS = (
+    StockMovement.id,
+    StockMovement.movement_type,
+    StockMovement.quantity,
+    StockMovement.previous_stock,
+    StockMovement.new_stock,
+    StockMovement.reference_type,
+    StockMovement.reference_id,
+    StockMovement.notes,
+    StockMovement.created_at
+)
+
+EXPORT_FIELDS = [
+    "id", "type", "quantity", "previous", "new",
+    "reference_type", "reference_id", "date", "notes"
+]
+
+
+def encode_cursor(created_at: datetime, movement_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{movement_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for a malformed cursor"""
+    try:
+        created_at, movement_id = base64.urlsafe_b64decode(
+            cursor.encode("ascii")
+        ).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(movement_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _movement_dict(row) -> Dict:
+    return {
+        "id": row.id,
+        "type": row.movement_type,
+        "quantity": row.quantity,
+        "previous": row.previous_stock,
+        "new": row.new_stock,
+        "reference_type": row.reference_type,
+        "reference_id": row.reference_id,
+        "date": row.created_at.isoformat() if row.created_at else None,
+        "notes": row.notes
+    }
+
+
+def _history_query(
+    db: Session,
+    product_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    query = db.query(*HISTORY_COLUMNS).filter(StockMovement.product_id == product_id)
+    if start is not None:
+        query = query.filter(StockMovement.created_at >= start)
+    if end is not None:
+        query = query.filter(StockMovement.created_at < end)
+    return query
+
+
+def _page(query, limit: int, after: Optional[Tuple[datetime, int]]):
+    if after is not None:
+        query = query.filter(
+            tuple_(StockMovement.created_at, StockMovement.id) < tuple_(*after)
+        )
+    return query.order_by(
+        StockMovement.created_at.desc(), StockMovement.id.desc()
+    ).limit(limit).all()
+
+
+def history_page(
+    db: Session,
+    product_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of movements, newest first
+    Returns (movements, next_cursor); next_cursor is None on the last page
+    """
+    after = decode_cursor(cursor) if cursor else None
+    rows = _page(_history_query(db, product_id, start, end), limit + 1, after)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return [_movement_dict(row) for row in rows], next_cursor
+
+
+def daily_history(
+    db: Session,
+    product_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> List[Dict]:
+    """Movements aggregated per day, newest first"""
+    day = func.date(StockMovement.created_at)
+    query = db.query(
+        day.label("day"),
+        func.count(StockMovement.id),
+        func.sum(StockMovement.quantity),
+        func.sum(case((StockMovement.quantity < 0, -StockMovement.quantity), else_=0)),
+        func.sum(case((StockMovement.quantity > 0, StockMovement.quantity), else_=0))
+    ).filter(StockMovement.product_id == product_id)
+    if start is not None:
+        query = query.filter(StockMovement.created_at >= start)
+    if end is not None:
+        query = query.filter(StockMovement.created_at < end)
+
+    return [
+        {
+            "date": str(row_day),
+            "movements": movements,
+            "net_change": net or 0,
+            "stock_out": out or 0,
+            "stock_in": stock_in or 0
+        }
+        for row_day, movements, net, out, stock_in in query.group_by(day).order_by(day.desc()).all()
+    ]
+
+
+def iter_history(
+    db: Session,
+    product_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    batch_size: int = 1000
+) -> Iterator[Dict]:
+    """Every movement in range, newest first, read in keyset batches"""
+    query = _history_query(db, product_id, start, end)
+    after = None
+    while True:
+        rows = _page(query, batch_size, after)
+        for row in rows:
+            yield _movement_dict(row)
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1].created_at, rows[-1].id)
+
+
+def stream_csv(movements: Iterator[Dict], chunk_size: int = 65536) -> Iterator[str]:
+    """CSV text in chunks of roughly chunk_size characters"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for movement in movements:
+        writer.writerow(movement)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def stream_ndjson(movements: Iterator[Dict]) -> Iterator[str]:
+    """One JSON object per line"""
+    for movement in movements:
+        yield json.dumps(movement) + "\n"
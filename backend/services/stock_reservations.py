@@ -0,0 +1,81 @@
+"""
+Stock reservations - hold stock for payments awaiting verification
+
+Reserving adds to products.reserved_stock in the same versioned UPDATE
+that checks availability (current_stock - reserved_stock), so a check
+reads one row per product and never sums the reservations table.
+
+Expiry is driven by an in-process min-heap of (expires_at, payment_id):
+the sweeper pops only reservations that are due and releases them by
+payment_id. The heap is rebuilt at startup from the (status, expires_at)
+index; the release itself only touches rows still active, so a payment
+released by another process is simply skipped.
+"""
+
+import heapq
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+ACTIVE = "active"
+CONVERTED = "converted"
+RELEASED = "released"
+EXPIRED = "expired"
+
+
+class ReservationBook:
+    """
+    In-memory expiry heap of payments holding active reservations
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []
+        self._active: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    def load(self, db: Session):
+        """Rebuild from the active reservations in the database"""
+        from backend.models.database import StockReservation
+
+        rows = db.query(
+            StockReservation.payment_id, func.min(StockReservation.expires_at)
+        ).filter(StockReservation.status == ACTIVE).group_by(StockReservation.payment_id).all()
+
+        with self._lock:
+            self._active = {payment_id: expires_at for payment_id, expires_at in rows}
+            self._heap = [(expires_at, payment_id) for payment_id, expires_at in rows]
+            heapq.heapify(self._heap)
+
+    def add(self, payment_id: int, expires_at: datetime):
+        with self._lock:
+            self._active[payment_id] = expires_at
+            heapq.heappush(self._heap, (expires_at, payment_id))
+
+    def discard(self, payment_id: int):
+        """Forget a payment; its heap entry is skipped when it surfaces"""
+        with self._lock:
+            self._active.pop(payment_id, None)
+
+    def is_active(self, payment_id: int) -> bool:
+        return payment_id in self._active
+
+    def expires_at(self, payment_id: int) -> Optional[datetime]:
+        return self._active.get(payment_id)
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[int]:
+        """Payments whose reservations have expired, removed from the book"""
+        now = now or datetime.utcnow()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, payment_id = heapq.heappop(self._heap)
+                if self._active.get(payment_id) == expires_at:
+                    del self._active[payment_id]
+                    due.append(payment_id)
+        return due
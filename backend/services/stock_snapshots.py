@@ -0,0 +1,216 @@
+"""
+Stock snapshots - periodic per-product checkpoints of the stock ledger
+
+A snapshot run records, for every product that moved since the previous
+run, its ledger stock after all movements up to a movement id. Stock at
+any past moment is then the nearest earlier snapshot plus the movements
+after it, and checking products.current_stock against the ledger only
+reads the movements since the last run, not the whole history.
+
+Runs skip the last SETTLE_SECONDS of movements so rows from transactions
+still in flight are never left behind a checkpoint. Every movement after
+a run's last_movement_id was therefore created after its snapshot_at.
+
+Products without a snapshot start from the previous_stock of their first
+movement (stock set at creation is not a movement).
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, insert
+from sqlalchemy.orm import Session
+
+from backend.models.database import Product, StockMovement, StockSnapshot
+
+SETTLE_SECONDS = 300
+CHUNK_SIZE = 500
+
+
+def latest_run(db: Session) -> Tuple[int, Optional[datetime]]:
+    """(last_movement_id, snapshot_at) of the newest snapshot run, (0, None) if none"""
+    row = db.query(
+        StockSnapshot.last_movement_id, StockSnapshot.snapshot_at
+    ).order_by(StockSnapshot.last_movement_id.desc()).first()
+    return (row[0], row[1]) if row else (0, None)
+
+
+def _latest_snapshot_stock(db: Session) -> Dict[int, float]:
+    latest = db.query(
+        StockSnapshot.product_id,
+        func.max(StockSnapshot.last_movement_id).label("last_movement_id")
+    ).group_by(StockSnapshot.product_id).subquery()
+
+    return dict(db.query(StockSnapshot.product_id, StockSnapshot.stock).join(
+        latest,
+        and_(
+            StockSnapshot.product_id == latest.c.product_id,
+            StockSnapshot.last_movement_id == latest.c.last_movement_id
+        )
+    ).all())
+
+
+def _ledger_deltas(
+    db: Session,
+    after_id: int,
+    after_at: Optional[datetime],
+    upto_id: Optional[int] = None
+) -> Dict[int, Tuple[float, int]]:
+    """{product_id: (net quantity, first movement id)} for movements after a run"""
+    query = db.query(
+        StockMovement.product_id,
+        func.sum(StockMovement.quantity),
+        func.min(StockMovement.id)
+    ).filter(StockMovement.id > after_id)
+    if after_at is not None:
+        query = query.filter(StockMovement.created_at > after_at)
+    if upto_id is not None:
+        query = query.filter(StockMovement.id <= upto_id)
+
+    return {
+        product_id: (net or 0, first_id)
+        for product_id, net, first_id in query.group_by(StockMovement.product_id).all()
+    }
+
+
+def _opening_stock(db: Session, movement_ids: List[int]) -> Dict[int, float]:
+    """previous_stock of the given movements, by product"""
+    openings = {}
+    for i in range(0, len(movement_ids), CHUNK_SIZE):
+        openings.update(db.query(
+            StockMovement.product_id, StockMovement.previous_stock
+        ).filter(StockMovement.id.in_(movement_ids[i:i + CHUNK_SIZE])).all())
+    return openings
+
+
+def ledger_stock(
+    db: Session,
+    upto_id: Optional[int] = None,
+    run: Optional[Tuple[int, Optional[datetime]]] = None
+) -> Tuple[Dict[int, float], Set[int]]:
+    """
+    Ledger stock per product: latest snapshot (or opening stock) plus the
+    movements after the latest run, up to upto_id if given
+    Returns (stock, ids of products that moved after the run)
+    """
+    after_id, after_at = run or latest_run(db)
+    snapshots = _latest_snapshot_stock(db)
+    deltas = _ledger_deltas(db, after_id, after_at, upto_id)
+    openings = _opening_stock(db, [
+        first_id for product_id, (_, first_id) in deltas.items()
+        if product_id not in snapshots
+    ])
+
+    stock = dict(snapshots)
+    for product_id, (net, _) in deltas.items():
+        base = snapshots[product_id] if product_id in snapshots else openings.get(product_id, 0)
+        stock[product_id] = (base or 0) + net
+    return stock, set(deltas)
+
+
+def create_snapshots(db: Session, settle_seconds: int = SETTLE_SECONDS) -> Dict:
+    """
+    Checkpoint every product that moved since the previous run
+    Returns {"snapshots", "last_movement_id", "snapshot_at"}
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settle_seconds)
+    upto_id = db.query(func.max(StockMovement.id)).filter(
+        StockMovement.created_at <= cutoff
+    ).scalar() or 0
+
+    run = latest_run(db)
+    if upto_id <= run[0]:
+        return {
+            "snapshots": 0,
+            "last_movement_id": run[0],
+            "snapshot_at": run[1].isoformat() if run[1] else None
+        }
+
+    stock, moved = ledger_stock(db, upto_id=upto_id, run=run)
+    now = datetime.utcnow()
+    db.execute(insert(StockSnapshot), [
+        {
+            "product_id": product_id,
+            "snapshot_at": cutoff,
+            "last_movement_id": upto_id,
+            "stock": stock[product_id],
+            "created_at": now
+        }
+        for product_id in sorted(moved)
+    ])
+    db.commit()
+
+    return {
+        "snapshots": len(moved),
+        "last_movement_id": upto_id,
+        "snapshot_at": cutoff.isoformat()
+    }
+
+
+def stock_at(db: Session, product_id: int, at: datetime) -> Optional[Dict]:
+    """
+    Stock of a product at a past moment: nearest earlier snapshot plus
+    the movements between it and `at`. None if the product doesn't exist
+    """
+    product = db.query(Product.id, Product.current_stock).filter(Product.id == product_id).first()
+    if product is None:
+        return None
+
+    snapshot = db.query(StockSnapshot).filter(
+        StockSnapshot.product_id == product_id,
+        StockSnapshot.snapshot_at <= at
+    ).order_by(StockSnapshot.snapshot_at.desc(), StockSnapshot.last_movement_id.desc()).first()
+
+    movements = db.query(
+        func.sum(StockMovement.quantity), func.count(StockMovement.id)
+    ).filter(
+        StockMovement.product_id == product_id,
+        StockMovement.created_at <= at
+    )
+
+    if snapshot is not None:
+        base = snapshot.stock
+        movements = movements.filter(
+            StockMovement.created_at > snapshot.snapshot_at,
+            StockMovement.id > snapshot.last_movement_id
+        )
+    else:
+        first = db.query(StockMovement.previous_stock).filter(
+            StockMovement.product_id == product_id
+        ).order_by(StockMovement.created_at, StockMovement.id).first()
+        base = first[0] if first else (product.current_stock or 0)
+
+    net, applied = movements.one()
+
+    return {
+        "product_id": product_id,
+        "at": at.isoformat(),
+        "stock": base + (net or 0),
+        "snapshot_at": snapshot.snapshot_at.isoformat() if snapshot else None,
+        "snapshot_stock": snapshot.stock if snapshot else None,
+        "movements_applied": applied
+    }
+
+
+def verify_ledger(db: Session, tolerance: float = 1e-6) -> List[Dict]:
+    """
+    Compare products.current_stock with the ledger
+    Returns one entry per product that disagrees; empty means consistent
+    """
+    stock, _ = ledger_stock(db)
+    current = dict(db.query(Product.id, Product.current_stock).all())
+
+    return [
+        {
+            "product_id": product_id,
+            "current_stock": current[product_id] or 0,
+            "ledger_stock": expected,
+            "difference": (current[product_id] or 0) - expected
+        }
+        for product_id, expected in sorted(stock.items())
+        if product_id in current and abs((current[product_id] or 0) - expected) > tolerance
+    ]
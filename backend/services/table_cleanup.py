@@ -0,0 +1,187 @@
+"""
+Table cleanup - typed DataFrames from reconstructed OCR ledger rows
+
+Shared by AdvancedOCR and BookReportOCR. Rows are padded to the most
+common row length and every column is cleaned as a whole with pandas
+string ops. Plain numeric columns take the C to_numeric path (not when
+a cell has dotted thousands like "12.500"); other columns are factorized first, so each distinct value (dates, prices and
+items repeat a lot in a ledger) is parsed once:
+
+- OCR digit fixes (O -> 0, l -> 1) only inside a token that starts
+  with a digit and is otherwise a number ("1O.OOO", "12/O1/2O24");
+  letter prefixes like "B12" or "l2" stay text
+- Rupiah amounts: "Rp 1.250.000,00", "1.250.000,-", "IDR 75.500",
+  "1,250,000", "(5.000)" and "-5.000" all parse in one regex pass; "."
+  is read as the thousands separator when followed by groups of three
+  digits
+- Dates: "04/12/2023", "4-12-23", "4 Des 2023", "12 Januari 2024",
+  "2023-12-04" (day first, Indonesian or English month names)
+
+A column becomes numeric (Int64 when every value is whole, else float64)
+or datetime only if every non-empty cell parses, and digit fixes are
+only tried on a column where most cells (MIN_PARSED_SHARE) already parse
+without them; otherwise it keeps its text, so a code column is never
+read as numbers and a misread cell never silently turns into an empty one.
+"""
+
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Letters OCR confuses with digits; fixed only in a token that starts with a digit
+OCR_DIGIT_FIXES = str.maketrans({"O": "0", "o": "0", "l": "1"})
+_NUMBER_LIKE = r"\(?-?\d[\d.,/\-Ool]*\)?(?:,-+)?"
+MIN_PARSED_SHARE = 0.8
+
+_CURRENCY = r"(?i)^\s*(?:rp\.?|idr)\s*"
+
+# One pass per cell: optional currency and sign, then 1.250.000(,50) | 1,250,000(.50) | 1250000(,50 or .5),
+# with an optional ",-" ending ("Rp 5.000,-") and (parentheses) for negatives
+_AMOUNT = (
+    r"^\s*(?:[Rr][Pp]\.?|IDR)?\s*(?P<open>\()?(?P<minus>-)?\s*"
+    r"(?:(?P<dot>\d{1,3}(?:\.\d{3})+)(?:,(?P<dot_dec>\d+))?"
+    r"|(?P<comma>\d{1,3}(?:,\d{3})+)(?:\.(?P<comma_dec>\d+))?"
+    r"|(?P<plain>\d+)(?:,(?P<plain_comma>\d{1,2})|\.(?P<plain_dot>\d+))?)"
+    r"(?:,-+)?\s*(?P<close>\))?\s*$"
+)
+
+# Month names and abbreviations (Indonesian and English), by first three letters
+MONTHS = {
+    "jan": 1, "feb": 2, "peb": 2, "mar": 3, "apr": 4, "mei": 5, "may": 5, "jun": 6,
+    "jul": 7, "agu": 8, "agt": 8, "ags": 8, "aug": 8, "sep": 9, "okt": 10, "oct": 10,
+    "nov": 11, "nop": 11, "des": 12, "dec": 12
+}
+# "12.500" is twelve thousand five hundred, not 12.5 (to_numeric would read it as a decimal)
+_DOTTED_THOUSANDS = r"\d\.\d{3}(?:\D|$)"
+_DAY_FIRST = r"^(?P<day>\d{1,2})[\s/.\-]+(?P<month>\d{1,2}|[a-z]{3,9})\.?[\s/.\-]+(?P<year>\d{4}|\d{2})$"
+_YEAR_FIRST = r"^(?P<year>\d{4})[/.\-](?P<month>\d{1,2})[/.\-](?P<day>\d{1,2})$"
+
+
+def rows_to_frame(rows: List[List[str]]) -> pd.DataFrame:
+    """
+    Text DataFrame of the rows: first row is the header, rows are padded
+    or cut to the most common row length, empty cells are NaN
+    """
+    if not rows:
+        return pd.DataFrame()
+
+    row_lengths = [len(row) for row in rows]
+    num_columns = max(set(row_lengths), key=row_lengths.count)
+    if num_columns == 0:
+        return pd.DataFrame()
+
+    grid = np.full((len(rows), num_columns), None, dtype=object)
+    for idx, row in enumerate(rows):
+        cells = [str(item).strip() or None if item else None for item in row[:num_columns]]
+        grid[idx, :len(cells)] = cells
+
+    header = ["" if name is None else name for name in grid[0]]
+    return pd.DataFrame(grid[1:], columns=header)
+
+
+def fix_ocr_digits(values: pd.Series) -> pd.Series:
+    """Swap digit look-alike letters in number-like cells; other cells are untouched"""
+    text = values.astype("object").where(values.notna(), "").astype(str)
+    text = text.str.replace(_CURRENCY, "", regex=True)
+    number_like = text.str.fullmatch(_NUMBER_LIKE)
+    return values.where(~number_like, text.str.translate(OCR_DIGIT_FIXES))
+
+
+def parse_amounts(values: pd.Series) -> pd.Series:
+    """float64 amounts; cells that aren't an amount become NaN"""
+    text = values.astype("object").where(values.notna(), "").astype(str)
+    parts = text.str.extract(_AMOUNT)
+
+    integer = (parts["dot"].str.replace(".", "", regex=False)
+               .fillna(parts["comma"].str.replace(",", "", regex=False))
+               .fillna(parts["plain"]))
+    decimals = parts["dot_dec"].fillna(parts["comma_dec"]).fillna(parts["plain_comma"]).fillna(parts["plain_dot"])
+    amounts = pd.to_numeric(integer + "." + decimals.fillna("0"), errors="coerce")
+
+    negative = parts["minus"].notna() | (parts["open"].notna() & parts["close"].notna())
+    return amounts.where(~negative, -amounts)
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """datetime64 dates (day first); cells that aren't a date become NaT"""
+    text = values.astype("object").where(values.notna(), "").astype(str).str.strip().str.lower()
+
+    parts = text.str.extract(_DAY_FIRST)
+    year_first = text.str.extract(_YEAR_FIRST)
+    parts = parts.fillna(year_first[["day", "month", "year"]])
+
+    month = pd.to_numeric(parts["month"], errors="coerce")
+    month = month.fillna(parts["month"].str[:3].map(MONTHS))
+    year = pd.to_numeric(parts["year"], errors="coerce")
+    year = year.where(year >= 100, year + 2000)
+
+    return pd.to_datetime(
+        pd.DataFrame({"year": year, "month": month, "day": pd.to_numeric(parts["day"], errors="coerce")}),
+        errors="coerce"
+    )
+
+
+def _typed_numbers(values: pd.Series) -> pd.Series:
+    """Int64 when every value is whole, else float64"""
+    present = values.dropna()
+    if (present == np.round(present)).all() and (present.abs() < 2 ** 53).all():
+        return values.round().astype("Int64")
+    return values.astype("float64")
+
+
+def _parse_column(distinct: pd.Series, parse) -> Optional[pd.Series]:
+    """
+    parse(distinct) if every value parses; digit fixes are tried only on
+    the values that fail, and only when most already parse as they are
+    """
+    parsed = parse(distinct)
+    failed = parsed.isna()
+    if not failed.any():
+        return parsed
+    if 1 - failed.mean() < MIN_PARSED_SHARE:
+        return None
+
+    fixed = parse(fix_ocr_digits(distinct[failed]))
+    if fixed.isna().any():
+        return None
+    parsed[failed] = fixed
+    return parsed
+
+
+def type_column(values: pd.Series) -> pd.Series:
+    """Numeric or datetime if every non-empty cell parses as one, else the text as is"""
+    if not values.notna().any():
+        return values
+
+    # Plain numbers need no string work at all, unless a cell has dotted thousands
+    if not values.dropna().astype(str).str.contains(_DOTTED_THOUSANDS).any():
+        numbers = pd.to_numeric(values, errors="coerce")
+        if numbers.notna().sum() == values.notna().sum():
+            return _typed_numbers(numbers)
+
+    # Ledger columns repeat a lot (dates, prices, items): parse each distinct value once
+    codes, uniques = pd.factorize(values)
+    distinct = pd.Series(uniques, dtype="object")
+
+    def expand(parsed: pd.Series) -> pd.Series:
+        return pd.Series(parsed.to_numpy()[codes], index=values.index).where(codes >= 0)
+
+    amounts = _parse_column(distinct, parse_amounts)
+    if amounts is not None:
+        return _typed_numbers(expand(amounts))
+
+    dates = _parse_column(distinct, parse_dates)
+    if dates is not None:
+        return pd.to_datetime(expand(dates))
+
+    return values
+
+
+def normalize_table(rows: List[List[str]]) -> pd.DataFrame:
+    """Typed DataFrame of reconstructed rows (first row is the header)"""
+    df = rows_to_frame(rows)
+    for idx in range(df.shape[1]):
+        # Positional, so repeated or empty header names are fine
+        df.isetitem(idx, type_column(df.iloc[:, idx]))
+    return df
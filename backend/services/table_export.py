@@ -0,0 +1,309 @@
+"""
+Table export - OCR tables to Excel, CSV and Parquet, to files or streamed
+
+Excel is written with openpyxl in write-only mode (rows go out as they
+are appended, never held as a cell grid) and column widths come from one
+vectorized length pass over the values. Columns are named with
+get_column_letter, so tables wider than 26 columns keep their widths.
+
+For HTTP responses the writers run in a helper thread that writes into a
+bounded chunk queue, and the response body iterates that queue: the
+output is never assembled in a temp file or in memory (openpyxl only
+spools each sheet's XML while its rows are appended), and a slow client
+slows the writer instead of letting output pile up.
+
+Parquet needs pyarrow (optional).
+"""
+
+import csv
+import io
+import queue
+import threading
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils import get_column_letter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+FORMATS = ("xlsx", "csv", "parquet")
+MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet"
+}
+MAX_WIDTH = 50
+CHUNK_SIZE = 65536
+BATCH_ROWS = 10000
+
+
+def cell_value(value):
+    """Plain Python value for a cell; NaN/NaT/None become empty"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def column_widths(header: Sequence, values: np.ndarray, max_width: int = MAX_WIDTH) -> np.ndarray:
+    """Width per column: longest header or value (empty cells count 0) + 2, capped"""
+    header_lengths = np.array([len(str(name)) for name in header], dtype=np.int64)
+    if values.size == 0:
+        return np.minimum(header_lengths + 2, max_width)
+
+    text = pd.DataFrame(values).fillna("").astype(str).to_numpy(dtype=str)
+    lengths = np.char.str_len(text).max(axis=0)
+    return np.minimum(np.maximum(lengths, header_lengths) + 2, max_width)
+
+
+def set_column_widths(sheet, widths: Iterable[float], offset: int = 0):
+    """Apply widths (before any row is written, for write-only sheets)"""
+    for idx, width in enumerate(widths):
+        sheet.column_dimensions[get_column_letter(idx + 1 + offset)].width = float(width)
+
+
+def frame_table(df: pd.DataFrame) -> Tuple[List[str], np.ndarray]:
+    """(header, object array of values) of a DataFrame"""
+    return [str(column) for column in df.columns], df.astype(object).to_numpy()
+
+
+# Writers (to a path or any binary file object)
+
+def write_excel(
+    tables: Sequence[Tuple[str, Sequence, Iterable[Sequence], Optional[Sequence[float]]]],
+    target: Union[str, BinaryIO]
+):
+    """
+    Write-only workbook with one sheet per (sheet_name, header, rows, widths)
+    widths may be None (no sizing)
+    """
+    workbook = Workbook(write_only=True)
+    for sheet_name, header, rows, widths in tables:
+        sheet = workbook.create_sheet(sheet_name)
+        if widths is not None:
+            set_column_widths(sheet, widths)
+        sheet.append(list(header))
+        for row in rows:
+            sheet.append([cell_value(value) for value in row])
+    workbook.save(target)
+
+
+def write_dataframe_excel(df: pd.DataFrame, target: Union[str, BinaryIO], sheet_name: str = "Laporan"):
+    header, values = frame_table(df)
+    write_excel([(sheet_name, header, values, column_widths(header, values))], target)
+
+
+def numeric_columns(header: Sequence, rows: Iterable[Sequence]) -> List[bool]:
+    """Per column: every non-empty value is a number (bools excluded)"""
+    numeric = [True] * len(header)
+    for row in rows:
+        for idx, value in enumerate(row[:len(header)]):
+            if numeric[idx] and value is not None and value != "" and (
+                isinstance(value, bool) or not isinstance(value, (int, float, np.number))
+            ):
+                numeric[idx] = False
+    return numeric
+
+
+def write_parquet(
+    header: Sequence,
+    rows: Iterable[Sequence],
+    numeric: Sequence[bool],
+    target: Union[str, BinaryIO],
+    batch_rows: int = BATCH_ROWS
+):
+    """Parquet with float64 numeric columns and string others, one row group per batch"""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    names = [str(name) for name in header]
+    schema = pa.schema([
+        (name, pa.float64() if is_numeric else pa.string())
+        for name, is_numeric in zip(names, numeric)
+    ])
+
+    def to_batch(batch: List[Sequence]):
+        columns = []
+        for idx, is_numeric in enumerate(numeric):
+            values = [cell_value(row[idx]) if idx < len(row) else None for row in batch]
+            if is_numeric:
+                columns.append(pa.array([None if value is None else float(value) for value in values], pa.float64()))
+            else:
+                columns.append(pa.array([None if value is None else str(value) for value in values], pa.string()))
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    with pq.ParquetWriter(target, schema) as writer:
+        batch = []
+        written = False
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                writer.write_table(to_batch(batch))
+                batch = []
+                written = True
+        if batch or not written:
+            writer.write_table(to_batch(batch))
+
+
+def iter_csv(header: Sequence, rows: Iterable[Sequence], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """CSV (UTF-8 with BOM, so Excel opens it correctly) in chunks of roughly chunk_size"""
+    buffer = io.StringIO()
+    buffer.write("\ufeff")
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([cell_value(value) for value in row])
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue().encode("utf-8")
+
+
+# Streaming a file-object writer into an HTTP body
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable file object feeding a bounded queue in CHUNK_SIZE pieces"""
+
+    def __init__(self, chunks: "queue.Queue", cancelled: threading.Event):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.buffer = bytearray()
+        self.broken = False
+
+    def writable(self):
+        return True
+
+    def _put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                if self.broken:
+                    return  # Already reported; let the writer's cleanup finish quietly
+                self.broken = True
+                raise BrokenPipeError("Client went away")
+            try:
+                self.chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data) -> int:
+        self.buffer.extend(data)
+        while len(self.buffer) >= CHUNK_SIZE:
+            self._put(bytes(self.buffer[:CHUNK_SIZE]))
+            del self.buffer[:CHUNK_SIZE]
+        return len(data)
+
+    def flush(self):
+        if self.buffer and not self.cancelled.is_set():
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+
+
+_DONE = object()
+
+
+def stream_writer(write: Callable[[BinaryIO], None], max_chunks: int = 16) -> Iterator[bytes]:
+    """
+    Run write(file_object) in a thread and yield what it writes
+    At most max_chunks chunks are buffered; errors are re-raised here
+    """
+    chunks: "queue.Queue" = queue.Queue(max_chunks)
+    cancelled = threading.Event()
+    sink = _ChunkSink(chunks, cancelled)
+
+    def run():
+        try:
+            write(sink)
+            sink.flush()
+        except Exception as e:
+            if not cancelled.is_set():
+                chunks.put(e)
+        finally:
+            if not cancelled.is_set():
+                chunks.put(_DONE)
+
+    threading.Thread(target=run, name="table-export", daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+
+
+# Tables of a stored workbook
+
+def workbook_sheets(path: str) -> List[str]:
+    workbook = load_workbook(path, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+def iter_sheet(path: str, sheet_name: str) -> Tuple[List, Iterator[tuple]]:
+    """
+    (header, rows) of one sheet, read in streaming (read-only) mode
+    Raises KeyError if the sheet doesn't exist
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    if sheet_name not in workbook.sheetnames:
+        workbook.close()
+        raise KeyError(sheet_name)
+
+    rows = workbook[sheet_name].iter_rows(values_only=True)
+    header = list(next(rows, ()))
+
+    def body():
+        try:
+            for row in rows:
+                yield row
+        finally:
+            workbook.close()
+
+    return header, body()
+
+
+def export_sheet(path: str, sheet_name: str, fmt: str) -> Iterator[bytes]:
+    """
+    Stream one sheet of a stored workbook as xlsx, csv or parquet
+    Sizing (xlsx) and typing (parquet) take a first streaming pass
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if fmt == "parquet" and not PARQUET_AVAILABLE:
+        raise ValueError("Parquet export requires pyarrow")
+
+    header, rows = iter_sheet(path, sheet_name)
+    if fmt == "csv":
+        return iter_csv(header, rows)
+
+    if fmt == "parquet":
+        numeric = numeric_columns(header, rows)
+        _, rows = iter_sheet(path, sheet_name)
+        return stream_writer(lambda sink: write_parquet(header, rows, numeric, sink))
+
+    widths = np.array([len(str(name)) for name in header], dtype=np.int64)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_ROWS:
+            widths = np.maximum(widths, column_widths(header, np.array(batch, dtype=object)) - 2)
+            batch = []
+    if batch:
+        widths = np.maximum(widths, column_widths(header, np.array(batch, dtype=object)) - 2)
+    widths = np.minimum(widths + 2, MAX_WIDTH)
+
+    _, rows = iter_sheet(path, sheet_name)
+    return stream_writer(lambda sink: write_excel([(sheet_name, header, rows, widths)], sink))